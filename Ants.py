@@ -5,10 +5,20 @@ import random
 import matplotlib.pyplot as plt
 import numpy as np
 import csv
-import pandas as pd
 import time
 import argparse
+import json
 import os
+from brain_snapshot import save_snapshot, write_labels, export_brain_csv
+from log_writer import AsyncLogWriter
+from headless_render import FrameExporter
+from strip_pheromone import StripPheromoneEngine
+from pheromone_deposits import PheromoneDeposits
+from likeness_quantizer import LikenessQuantizer, quantization_of
+from convergence import ConvergenceMonitor
+from colony_state import ColonyState, ColonyBrain, SEARCH_FOOD, SEARCH_HOME
+from warm_start import load_warm_start, apply_warm_start, WarmStartHandle
+from telemetry import TelemetryPublisher, FINISHED, STOPPED
 
 start_time = time.time()
 parser = argparse.ArgumentParser(description='Run The ants simulation.')
@@ -25,6 +35,47 @@ parser.add_argument('--discounted_return', type=float, default=0.85)
 parser.add_argument('--drop_amount', type=float, default=0.05)
 parser.add_argument('--dispersion_rate', type=float, default=0.1)
 parser.add_argument('--decay_rate', type=float, default=0.03)
+parser.add_argument('--snapshot_every', type=int, default=0,
+                    help='Save a snapshot of all the Q-tables every N steps (0 to disable)')
+parser.add_argument('--no_brain_csv', action='store_true',
+                    help='Only save the compressed Brains.npz and skip the Ant_<i>_Brain.csv files')
+parser.add_argument('--frame_every', type=int, default=0,
+                    help='Save a frame of the world every N steps without the visualiser (0 to disable)')
+parser.add_argument('--frame_format', type=str, default='png', help='Format of the saved frames (png/npy)')
+parser.add_argument('--world_rows', type=int, default=30, help='Number of rows of the world')
+parser.add_argument('--world_columns', type=int, default=30, help='Number of columns of the world')
+parser.add_argument('--home', type=int, nargs=2, default=[15, 15], metavar=('X', 'Y'),
+                    help='Top left cell of the 2x2 home')
+parser.add_argument('--target', type=int, nargs=2, default=[10, 10], metavar=('X', 'Y'),
+                    help='Top left cell of the 2x2 target')
+parser.add_argument('--strip_workers', type=int, default=0,
+                    help='Decay and disperse the pheromones on N worker processes, one strip of rows each '
+                         '(0 to use a single process)')
+parser.add_argument('--immediate_deposits', action='store_true',
+                    help='Deposit every drop of pheromone immediately instead of all together at the end of the step')
+parser.add_argument('--likeness_buckets', type=int, default=5,
+                    help='Number of levels the ants sense for how much a cell is like Home/Target')
+parser.add_argument('--likeness_spacing', type=str, default='linear', help='Spacing of the levels (linear/log)')
+parser.add_argument('--stop_on_plateau', action='store_true',
+                    help='Stop the run early once the food collected per 1000 steps stops changing')
+parser.add_argument('--plateau_windows', type=int, default=5, help='Number of 1000 step windows compared')
+parser.add_argument('--plateau_tolerance', type=float, default=0.05, help='Largest change that counts as a plateau')
+parser.add_argument('--frozen_steps', type=int, default=0,
+                    help='Stop the run early if no ant changes its state or action for N steps (0 to disable)')
+parser.add_argument('--warm_start', type=str, default=None,
+                    help='Start the Q-tables from a snapshot (.npz) or a directory of Ant_<i>_Brain.csv files')
+parser.add_argument('--warm_start_average', action='store_true',
+                    help='Start every ant from the average Q-table of the warm start colony')
+parser.add_argument('--warm_start_buckets', type=int, default=None,
+                    help='Likeness buckets the warm start tables were made with. '
+                         'Needed for Brain.csv files, which do not record it')
+parser.add_argument('--warm_start_spacing', type=str, default='linear',
+                    help='Likeness spacing the warm start tables were made with (linear/log)')
+parser.add_argument('--warm_start_exploration', type=float, default=None,
+                    help='Exploration rate to start from (Defaults to exploration_rate)')
+parser.add_argument('--telemetry_every', type=int, default=0,
+                    help='Update the live status of the run every N steps (0 to disable). '
+                         'Watch it with python telemetry.py')
 
 args = parser.parse_args()
 """
@@ -38,8 +89,12 @@ Run like this::
 python Ants.py --no_show --start_as='Play' --max_steps=1000 --sim_name='Hope_this_works' --min_exploration=0.05 
 --exploration_rate=0.9 --exploration_decay=0.0001 --learning_rate=0.4 --discounted_return=0.85
 """
-random.seed(12345)
-np.random.seed(12345)
+sim_seed = 12345
+random.seed(sim_seed)
+np.random.seed(sim_seed)
+# Name of the default world set up in Visualise. Change it if the default world changes, the result cache uses it.
+# Runs with another world size or placement pass it to Visualise, which makes it part of their scenario.
+scenario_name = 'World_30x30_Home_15_Target_10_Ants_30'
 
 # show_print = False
 show_print = True
@@ -56,8 +111,18 @@ def progress_bar(progress, total):
         print('\r' + '\033[32m' + f'|{bar}| {percent:.2f}%' + '\033[0m')
 
 
-class Ant(Agent):
+# Index of each heading in DIRECTIONS.
+HEADINGS = {(int(direction.x), int(direction.y)): index for index, direction in enumerate(DIRECTIONS)}
+# The 3 cells ahead for each heading as (index in DIRECTIONS, x offset, y offset).
+# They are in the order front_right, front, front_left so that ties are broken the same way as the old list
+# that put every new candidate at the front.
+AHEAD = [tuple((DIRECTIONS.index(turn(direction)),
+                int(turn(direction).x),
+                int(turn(direction).y)) for turn in (front_right, front, front_left))
+         for direction in DIRECTIONS]
+
 
+class Ant(Agent):
     # Initialise the parent class. Make sure to initialise it with the child as self.
     def __init__(self, world, layer_name, position: Vector2 = Vector2(0, 0),
                  min_exploration=0.05,
@@ -65,69 +130,71 @@ class Ant(Agent):
                  exploration_decay=0.0001,
                  learning_rate=0.4,
                  discounted_return=0.85,
-                 drop_amount=0.05):
+                 drop_amount=0.05,
+                 deposits: PheromoneDeposits = None,
+                 home_quantizer: LikenessQuantizer = None,
+                 target_quantizer: LikenessQuantizer = None,
+                 colony: ColonyState = None,
+                 index=0):
         super().__init__(world=world, layer_name=layer_name, child=self, position=position,
                          action_list=['move_random', 'go_home', 'go_target', 'drop_home', 'drop_target'])
+        self.direction = Vector2(*self.direction)  # The parent gives a numpy copy. Use a vector of its own.
         self.has_food = False
         self.steps_since_pheromone_drop = 0
         # self.steps_since_last_food = 0  # might be usefull as a sense.
 
         self.home_likeness = 1  # How much the current cell is like Home according to the home pheromone
         self.target_likeness = 0  # How much the current cell is like Target according to the target pheromone
+        # True if the likeness was already sensed for the whole colony this step.
+        self.likeness_sensed = False
+        # The likeness is sensed in levels(buckets).
+        self.home_quantizer = home_quantizer if home_quantizer is not None else LikenessQuantizer()
+        self.target_quantizer = target_quantizer if target_quantizer is not None else LikenessQuantizer()
         # state_list = 'If the ant has food'+                        (True/False)
         #               'time since dropping the last pheromone.'+   (0,1,...4)
-        #               'how much is the cell like home'+            (0,1,2,3,4,...9)
-        #               'how much is the cell like target'           (0,1,2,3,4,...9)
-        self.max_states = (2 * 5 * 5 * 5)
+        #               'how much is the cell like home'+            (0,1,...home buckets - 1)
+        #               'how much is the cell like target'           (0,1,...target buckets - 1)
+        self.max_states = (2 * 5 * self.home_quantizer.buckets * self.target_quantizer.buckets)
         self.state_hash = ''  # it is a hash that represents the state the ant exists in.
 
         # Environment Parameters
         self.drop_amount = drop_amount
+        # Where the pheromone drops go. Without a shared one, each drop is deposited immediately.
+        self.deposits = deposits if deposits is not None else PheromoneDeposits(world, deferred=False)
+
+        # The Q-table, history and cumulative data live in the arrays of the colony, in row <index>.
+        # Without a shared one, the ant gets a colony of its own.
+        self.colony = colony if colony is not None else ColonyState(1, self.home_quantizer, self.target_quantizer,
+                                                                    self.action_list)
+        self.index = index if colony is not None else 0
 
         # Learning Parameters
+        self.brain = ColonyBrain(self.brain.brain_type, self.action_list)
         self.brain.min_exploration = min_exploration
         self.brain.exploration_rate = exploration_rate
         self.brain.exploration_decay = exploration_decay
         self.brain.learning_rate = learning_rate
         self.brain.discounted_return = discounted_return
         ################################################################################################################
-        # To Provide data for analysis.
-        # Consider using deque() for optimization later if needed.
-        # Not storing any history as time series list as it takes up lots of memory and causes low ram systems to crash.
-        # Temporary Data
-        self.history = {
-            'hash_history': '',  # history of the hash which caused it to select the action.
-            'action_history': '',  # Actions taken per timestep.
-            'state_history': '',  # State (Search Food or Search Home) achieved at this time step
-            # State achieved would mean that if the ant gets back home with food,
-            # The state achieved would be Search Food.
-            # I'm still not sure as to what this state history would help me achieve,
-            # But maybe it might come in handy.
-            'food_collection_history': 0  # 1 if food was collected within this step, 0 otherwise.
-        }
-
-        # Cumulative Data
-        self.cumulative = {
-            'total_food_count': 0,
-            'average_steps_before_collection': 0  # basically steps per food count.
-        }
-        ################################################################################################################
-        # to populate the entire state space. This will speed up the simulation.
-        full_state_table = {}
-        for _ant_food in [True, False]:
-            for _time_drop in [0, 1, 2, 3, 4]:
-                for _like_home in [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]:
-                    for _like_target in [0, 1, 2, 3, 4, 5, 6, 7, 8, 9]:
-                        state = (f'{_ant_food}_' +
-                                 f'{_time_drop}_' +
-                                 f'{_like_home}_' +
-                                 f'{_like_target}')
-                        # print(state)
-                        full_state_table[state] = np.zeros(len(self.action_list))
-
-        self.brain.q_table = dict(sorted(full_state_table.items()))
+        # The entire state space is populated by the colony. This will speed up the simulation.
+        # The states follow from the quantizers, so the brain never has to add a missing state.
+        self.brain.q_table = self.colony.q_table(self.index)
         ################################################################################################################
 
+    # To Provide data for analysis. Both are stored in the colony arrays and only turned into dictionaries here.
+    # Not storing any history as time series list as it takes up lots of memory and causes low ram systems to crash.
+    @property
+    def history(self):
+        # hash_history: the hash which caused it to select the action. action_history: Action taken.
+        # state_history: State (Search Food or Search Home) achieved at this time step.
+        # food_collection_history: 1 if food was collected within this step, 0 otherwise.
+        return self.colony.history(self.index)
+
+    @property
+    def cumulative(self):
+        # total_food_count and average_steps_before_collection (basically steps per food count).
+        return self.colony.cumulative(self.index)
+
     def reset_position(self):
         self.position += (Vector2(random.choice(self.world.layers['Home'])) - self.position)
         # It has to be done this way because, the position is stored as a reference in the layer.
@@ -140,93 +207,84 @@ class Ant(Agent):
         This updates the state_hash of the ant.
         :return:
         """
-        # Check Home Likeness
-        if self.position in self.world.layers['Home']:
-            home_likeness = 1
+        if self.likeness_sensed:
+            # Already sensed along with the rest of the colony.
+            self.likeness_sensed = False
         else:
-            home_likeness = (self.world.layers['Pheromone_Home'][int(self.position.y), int(self.position.x)] /
-                             self.world.layer_data['Pheromone_Home'][3])
+            x = int(self.position.x) + 1
+            y = int(self.position.y) + 1
 
-        # Check Target Likeness
-        if self.position in self.world.layers['Target']:
-            target_likeness = 1
-        else:
-            target_likeness = (self.world.layers['Pheromone_Target'][int(self.position.y), int(self.position.x)] /
-                               self.world.layer_data['Pheromone_Target'][3])
-        # self.state_hash = (f'{self.has_food}_' +
-        #                    f'{self.steps_since_pheromone_drop}_' +
-        #                    f'{round(home_likeness, 1):.1f}_' +
-        #                    f'{round(target_likeness, 1):.1f}')
-
-        self.state_hash = (f'{self.has_food}_' +
-                           f'{self.steps_since_pheromone_drop}_' +
-                           f'{round(home_likeness * 10)}_' +
-                           f'{round(target_likeness * 10)}')
-        # print(self.state_hash)
-        # print(self.state_hash)
+            # Check Home Likeness
+            if self.world.aim_grids['Home'].item(y, x) == 2:
+                home_likeness = 1
+            else:
+                home_likeness = (self.world.padded_layers['Pheromone_Home'].item(y, x) /
+                                 self.world.layer_data['Pheromone_Home'][3])
+
+            # Check Target Likeness
+            if self.world.aim_grids['Target'].item(y, x) == 2:
+                target_likeness = 1
+            else:
+                target_likeness = (self.world.padded_layers['Pheromone_Target'].item(y, x) /
+                                   self.world.layer_data['Pheromone_Target'][3])
+
+            self.home_likeness = self.home_quantizer.bucket(home_likeness)
+            self.target_likeness = self.target_quantizer.bucket(target_likeness)
+
+        # The hash is looked up rather than built, so no new string is made every step.
+        self.state_hash = self.colony.labels[self.has_food][self.steps_since_pheromone_drop][self.home_likeness][
+            self.target_likeness]
 
     def drop_pheromone(self, pheromone_type, quantity):
         pheromone_type = 'Pheromone_' + pheromone_type  # for simplicity
-        self.world.layers[pheromone_type][int(self.position.y), int(self.position.x)] += quantity
+        # The deposits add it to the layer and cap it at the max value.
+        self.deposits.add(pheromone_type, int(self.position.x), int(self.position.y), quantity)
 
-        # capping pheromone at a cell to max value
-        max_pheromone = self.world.layer_data[pheromone_type][3]
-        pheromone_value = self.world.layers[pheromone_type][int(self.position.y), int(self.position.x)]
-        if pheromone_value > max_pheromone:
-            self.world.layers[pheromone_type][int(self.position.y), int(self.position.x)] = max_pheromone
-            # print(w.layers['Pheromone'][0])
+    def set_direction(self, direction):
+        # The direction is changed in place so that no new vector is made every move.
+        # (The ant owns its direction vector. Never keep a reference to one of the DIRECTIONS, as move() flips it.)
+        self.direction.x = direction.x
+        self.direction.y = direction.y
 
     def move_to_pheromone(self, pheromone_type):
         # move to the cell around it having the maximum value for the  Pheromone in the forward direction.
         aim = pheromone_type
         pheromone_type = 'Pheromone_' + pheromone_type  # for simplicity
-        pheromone_layer = self.world.layers[pheromone_type]
 
-        move_directions = []
-        max_pheromone_value = 0
-        # print(self.direction, DIRECTIONS)
-        front_index = self.position + front(self.direction)
-        front_left_index = self.position + front_left(self.direction)
-        front_right_index = self.position + front_left(self.direction)
-
-        for check_direction in [front_left_index, front_index, front_right_index]:
-            if (0 <= check_direction.x < self.world.c_length) and (0 <= check_direction.y < self.world.r_length):
-                # now we know the direction is possible.
-
-                # Directly select direction if it is home or target.
-                if check_direction in self.world.layers[aim]:
-                    if max_pheromone_value < 2:
-                        # This is the first aim cell we find.
-                        # Discard all other directions.
-                        move_directions = [check_direction - self.position]
-                        max_pheromone_value = 2
-                    else:
-                        # Append new aim cells to the list.
-                        move_directions = [check_direction - self.position, *move_directions]  # .
-
-                # The following won't work once an aim cell is found.
-                pheromone_value = pheromone_layer[int(check_direction.y), int(check_direction.x)]
-                if pheromone_value > max_pheromone_value:
-                    move_directions = [check_direction - self.position]  # we only need one direction if its max
-                    max_pheromone_value = pheromone_value
+        pheromone_layer = self.world.padded_layers[pheromone_type]
+        aim_grid = self.world.aim_grids[aim]
 
-                elif pheromone_value == max_pheromone_value:
-                    move_directions = [check_direction - self.position, *move_directions]  # appends to the list.
+        # The layers are padded by one cell of -inf, so cells outside the world can be read without checking the
+        # bounds and are never chosen. Home/Target cells score 2 which is more than any pheromone value.
+        x = int(self.position.x) + 1
+        y = int(self.position.y) + 1
+        move_directions = []
+        max_score = -np.inf
+        for direction_index, dx, dy in AHEAD[HEADINGS[self.direction.x, self.direction.y]]:
+            score = aim_grid.item(y + dy, x + dx)
+            pheromone_value = pheromone_layer.item(y + dy, x + dx)
+            if pheromone_value > score:
+                score = pheromone_value
+            if score > max_score:
+                move_directions = [direction_index]  # we only need one direction if its max
+                max_score = score
+            elif score == max_score:
+                move_directions.append(direction_index)
 
         # now we have checked through all 3 forward directions.
 
-        if len(move_directions) == 0:
+        if max_score == -np.inf:
             # it means there is no way forward.
             # self.direction = reflect(self.direction) This needs to be solved.
             self.direction = -self.direction
 
         else:
             # it means there is one or more of the directions to move towards.
-            self.direction = random.choice(move_directions).copy()
+            self.set_direction(DIRECTIONS[random.choice(move_directions)])
             self.move()
 
     def move_random(self):
-        self.direction = random.choice(DIRECTIONS).copy()
+        self.set_direction(random.choice(DIRECTIONS))
         self.move()
 
     def go_home(self):
@@ -245,13 +303,31 @@ class Ant(Agent):
 # Setting up the Visualiser.
 class Visualise(Realise):
     def __init__(self, dispersion_rate, decay_rate, drop_amount, no_show, start_as, max_steps, sim_name,
-                 exploration_rate, min_exploration, exploration_decay, learning_rate, discounted_return):
+                 exploration_rate, min_exploration, exploration_decay, learning_rate, discounted_return,
+                 snapshot_every=0, brain_csv=True, frame_every=0, frame_format='png', strip_workers=0,
+                 batch_deposits=True, likeness_buckets=5, likeness_spacing='linear', seed=None,
+                 stop_on_plateau=False, plateau_windows=5, plateau_tolerance=0.05, frozen_steps=0,
+                 write_logs=True, warm_start=None, warm_start_average=False, warm_start_exploration=None,
+                 warm_start_buckets=None, warm_start_spacing='linear', telemetry_every=0, r_length=30, c_length=30,
+                 home=(15, 15), target=(10, 10)):
         # To Set up the Visualisation, Initialise the class with the World, required variables, and the one_step_loop
         # Initialise the world with necessary size and layers.
         # It is not recommended that the number of layers be more than 10
         # It Might cause errors within the visualisation.
         # The simulation will however work fine. just that the option for selecting layers will be disabled
 
+        # Seed the run so that it does not depend on what ran before it in the same process.
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+        self.run_start = time.perf_counter()
+        # Saved with the results so that the run can be found by its parameters later (see run_catalog.py).
+        self.parameters = {'dispersion_rate': dispersion_rate, 'decay_rate': decay_rate, 'drop_amount': drop_amount,
+                           'min_exploration': min_exploration, 'exploration_rate': exploration_rate,
+                           'exploration_decay': exploration_decay, 'learning_rate': learning_rate,
+                           'discounted_return': discounted_return}
+        self.seed = seed
+
         # Create the necessary layers.
         layers = {'Pheromone_Target': ['Float', (250, 10, 50), 'None', 1],
                   'Pheromone_Home': ['Float', (85, 121, 207), 'None', 1],
@@ -259,25 +335,45 @@ class Visualise(Realise):
                   'Home': ['Block', (50, 98, 209), 'None'],
                   'Target': ['Block', (204, 4, 37), 'None']}
 
+        cell_size = 25
+        sim_background = (255, 255, 255)
+
         # Initialise the parent class. Make sure to initialise it with the child as self.
         # Adjust set parameters
-        super().__init__(world=World(layer_data=layers, r_length=30, c_length=30), child=self,
-                         visualise=not no_show, frame_rate_cap=600, cell_size=25, sim_background=(255, 255, 255))
+        # home and target are the (x, y) of the top left cell of the 2x2 Home/Target.
+        for aim, (x, y) in [('Home', home), ('Target', target)]:
+            if not (0 <= x < c_length - 1 and 0 <= y < r_length - 1):
+                raise ValueError(f'The 2x2 {aim} at ({x}, {y}) does not fit in a {r_length}x{c_length} world.')
+        super().__init__(world=World(layer_data=layers, r_length=r_length, c_length=c_length), child=self,
+                         visualise=not no_show, frame_rate_cap=600, cell_size=cell_size, sim_background=sim_background)
         self.state = start_as
         self.max_steps = max_steps
         self.sim_name = sim_name
+        self.log = log and write_logs  # Set write_logs to False to only keep the results in memory.
         # Set up the new variables and performing initial setups.
-        tl_home = 15  # top left cell of the 2x2 home
-        tl_target = 10  # top left cell of the 2x2 target
-        self.world.layers['Home'] = [[tl_home, tl_home],
-                                     [tl_home + 1, tl_home + 1],
-                                     [tl_home, tl_home + 1],
-                                     [tl_home + 1, tl_home]]
-        self.world.layers['Target'] = [[tl_target, tl_target],
-                                       [tl_target + 1, tl_target + 1],
-                                       [tl_target, tl_target + 1],
-                                       [tl_target + 1, tl_target]]
-
+        home_x, home_y = home  # top left cell of the 2x2 home
+        target_x, target_y = target  # top left cell of the 2x2 target
+        self.world.layers['Home'] = [[home_x, home_y],
+                                     [home_x + 1, home_y + 1],
+                                     [home_x, home_y + 1],
+                                     [home_x + 1, home_y]]
+        self.world.layers['Target'] = [[target_x, target_y],
+                                       [target_x + 1, target_y + 1],
+                                       [target_x, target_y + 1],
+                                       [target_x + 1, target_y]]
+        self.pad_layers()
+
+        # The pheromone dropped by all the ants is deposited together at the end of each step.
+        self.deposits = PheromoneDeposits(self.world, deferred=batch_deposits)
+        # The layers do not change during a step when the deposits are batched,
+        # so the initial likeness of all the ants can be sensed at once at the start of the step.
+        self.batch_sensing = batch_deposits
+        self.quantizer = LikenessQuantizer(buckets=likeness_buckets, spacing=likeness_spacing)
+
+        n_ants = 30
+        # The Q-tables, history and cumulative data of all the ants, one row per ant.
+        self.colony = ColonyState(n_ants, self.quantizer, self.quantizer,
+                                  ['move_random', 'go_home', 'go_target', 'drop_home', 'drop_target'])
         self.ant_list = [Ant(world=self.world,
                              layer_name='Ants',
                              position=Vector2(random.choice(self.world.layers['Home'])),
@@ -287,7 +383,33 @@ class Visualise(Realise):
                              exploration_decay=exploration_decay,
                              learning_rate=learning_rate,
                              discounted_return=discounted_return,
-                             ) for _ in range(30)]
+                             deposits=self.deposits,
+                             home_quantizer=self.quantizer,
+                             target_quantizer=self.quantizer,
+                             colony=self.colony,
+                             index=index,
+                             ) for index in range(n_ants)]
+        # Start from the Q-tables of an earlier run instead of all zeros.
+        # warm_start is a path for load_warm_start(), a WarmStartHandle or a (q_tables, states, actions, quantization)
+        # tuple. The tables must have been made with the same likeness buckets/spacing as this colony.
+        if warm_start is not None:
+            if isinstance(warm_start, str):
+                # Brain.csv files do not record the buckets/spacing they were made with, so they have to be given.
+                quantization = None
+                if warm_start_buckets is not None:
+                    warm_start_quantizer = LikenessQuantizer(buckets=warm_start_buckets, spacing=warm_start_spacing)
+                    quantization = quantization_of(warm_start_quantizer, warm_start_quantizer)
+                warm_start = load_warm_start(warm_start, quantization=quantization)
+            elif isinstance(warm_start, WarmStartHandle):
+                warm_start = warm_start.load()
+            q_tables, states, actions, quantization = warm_start
+            if warm_start_average:
+                q_tables = q_tables.mean(axis=0, keepdims=True)
+            apply_warm_start(self.colony, q_tables, states, actions, quantization)
+        if warm_start_exploration is not None:
+            # Learned tables need less exploring than empty ones.
+            for ant in self.ant_list:
+                ant.brain.exploration_rate = warm_start_exploration
         dispersion_rate = dispersion_rate  # percentage of pheromone to be dispersed.
         # calculate it like this, maybe. if 0.1 of the pheromone is to be dispersed then,
 
@@ -305,8 +427,129 @@ class Visualise(Realise):
         self.action_distribution = {}
         # {Time_step: ['move_random', 'go_home', 'go_target', 'drop_home', 'drop_target']}
 
-        # Do not add any variables after calling the loop. it will cause object has no attribute error when used.
-        self.run_sim()
+        # Early stopping.
+        self.convergence = None
+        if stop_on_plateau or frozen_steps:
+            self.convergence = ConvergenceMonitor(n_actions=len(self.ant_list[0].action_list),
+                                                  plateau_windows=plateau_windows, tolerance=plateau_tolerance,
+                                                  frozen_steps=frozen_steps, check_plateau=stop_on_plateau)
+        self.stop_reason = None  # Why the run ended ('Max_Steps', 'Plateau' or 'Frozen')
+        self.stop_step = None
+        # Food the run would have collected by max_steps. Same as total_food_collected unless it stopped early.
+        self.projected_food_collected = 0
+
+        # Brain Snapshots
+        self.snapshot_every = snapshot_every  # Save all the Q-tables every N steps. 0 to disable.
+        self.brain_csv = brain_csv  # Also export the Ant_<i>_Brain.csv files at the end.
+
+        # The outputs below hold threads, files, worker processes and shared memory.
+        # They are made inside the try, so that whatever was made is closed again if any of them fails.
+        self.log_writer = None
+        self.frame_exporter = None
+        self.telemetry = None
+        self.strip_engine = None
+        try:
+            # Logs are written by a background thread so that the simulation never waits on the disk.
+            if self.log:
+                self.log_writer = AsyncLogWriter(f"Analysis/{self.sim_name}/Log")
+
+            # Frames of the world rendered without the visualiser.
+            if frame_every:
+                self.frame_exporter = FrameExporter(self.world, f"Analysis/{self.sim_name}/Frames",
+                                                    every=frame_every, frame_format=frame_format,
+                                                    cell_size=cell_size, background=sim_background)
+
+            # Live status of the run for the monitor in telemetry.py.
+            if telemetry_every:
+                self.telemetry = TelemetryPublisher(self.sim_name, max_steps, every=telemetry_every)
+
+            # For very large worlds the pheromone update can be split into strips over several processes.
+            # It gives the same result as the Essence decay and disperse.
+            if strip_workers:
+                self.strip_engine = StripPheromoneEngine(self.world, ['Pheromone_Home', 'Pheromone_Target'],
+                                                         dispersion_matrix=dispersion_matrix,
+                                                         decay_rate=decay_rate, n_workers=strip_workers)
+
+            # Do not add any variables after calling the loop. it will cause object has no attribute error when used.
+            self.run_sim()
+        finally:
+            # Flush the logs and frames and stop the strip workers even if the simulation crashed.
+            self.close_outputs()
+
+    def pad_layers(self):
+        """
+        Sets up the padded grids the ants read when looking at the cells ahead of them.
+        The pheromone layers become views of the inside of a grid with a border of -inf. So the layers keep working
+        as before while the ants can read a neighbour without checking the bounds of the world.
+        The aim grids score 2 at Home/Target cells and -inf everywhere else.
+        :return:
+        """
+        self.world.padded_layers = {}
+        self.world.aim_grids = {}
+        for layer_type in ['Home', 'Target']:
+            padded = np.full((self.world.r_length + 2, self.world.c_length + 2), -np.inf)
+            padded[1:-1, 1:-1] = self.world.layers['Pheromone_' + layer_type]
+            self.world.padded_layers['Pheromone_' + layer_type] = padded
+            self.world.layers['Pheromone_' + layer_type] = padded[1:-1, 1:-1]
+
+            aim_grid = np.full_like(padded, -np.inf)
+            for [x, y] in self.world.layers[layer_type]:
+                aim_grid[y + 1, x + 1] = 2
+            self.world.aim_grids[layer_type] = aim_grid
+
+    def sync_padded_layers(self):
+        # Essence.disperse() replaces the layer with a new array. Copy it back into the padded grid.
+        # (The layers of the strip engine are always views of their padded grids.)
+        for layer_name, padded in self.world.padded_layers.items():
+            if not np.may_share_memory(self.world.layers[layer_name], padded):
+                padded[1:-1, 1:-1] = self.world.layers[layer_name]
+                self.world.layers[layer_name] = padded[1:-1, 1:-1]
+
+    def sense_colony_likeness(self):
+        """
+        Senses how much the cell of every ant is like Home/Target in one go.
+        The ants use this for their initial state instead of sensing it one by one.
+        :return:
+        """
+        x = np.array([ant.position.x for ant in self.ant_list], dtype=int) + 1
+        y = np.array([ant.position.y for ant in self.ant_list], dtype=int) + 1
+        likeness_buckets = []
+        for layer_type in ['Home', 'Target']:
+            likeness = (self.world.padded_layers['Pheromone_' + layer_type][y, x] /
+                        self.world.layer_data['Pheromone_' + layer_type][3])
+            likeness[self.world.aim_grids[layer_type][y, x] == 2] = 1
+            likeness_buckets.append(self.quantizer.buckets_of(likeness).tolist())
+        for ant, home_likeness, target_likeness in zip(self.ant_list, *likeness_buckets):
+            ant.home_likeness = home_likeness
+            ant.target_likeness = target_likeness
+            ant.likeness_sensed = True
+
+    def write_run_info(self, food, actions, window=1000):
+        """
+        Writes a summary of the run to Run_Info.json, so that it can be catalogued without reading all the logs.
+        :param food: (steps x ants) food collected.
+        :param actions: (steps x actions) action counts.
+        :param window: Steps per point of the food curve.
+        :return:
+        """
+        window_starts = np.arange(0, len(food), window)
+        food_curve = np.add.reduceat(food.sum(axis=1), window_starts) if len(food) else np.array([])
+        final_actions = actions[-window:].sum(axis=0)
+        run_info = {'sim_name': self.sim_name,
+                    'parameters': self.parameters,
+                    'seed': self.seed,
+                    'max_steps': self.max_steps,
+                    'steps': len(food),
+                    'stop_reason': self.stop_reason,
+                    'total_food': float(self.total_food_collected),
+                    'projected_food': float(self.projected_food_collected),
+                    'food_window': window,
+                    'food_curve': food_curve.tolist(),
+                    'action_mix': dict(zip(self.ant_list[0].action_list,
+                                           (final_actions / max(final_actions.sum(), 1)).tolist())),
+                    'runtime': time.perf_counter() - self.run_start}
+        with open(f"Analysis/{self.sim_name}/Log/Run_Info.json", 'w') as f:
+            json.dump(run_info, f)
 
     def setup_layers(self, file_path):
         # This will be added to the Realise function of the MNEST Package.
@@ -336,16 +579,22 @@ class Visualise(Realise):
         return
 
     # Storing data into memory and later writing it to a file causes memory crunch and freezes the system.
-    # Writing to file immediately is a better option.
+    # Handing it to the log writer immediately is a better option.
     def write_to_file(self, data, file_name):
         # Include extension in file name.
-        dir_path = f"Analysis/{self.sim_name}/Log"
-        # Check whether the specified path exists or not
-        if not os.path.exists(dir_path):
-            # Create a new directory because it does not exist
-            os.makedirs(dir_path)
-        with open(os.path.join(dir_path, file_name), 'a') as file:
-            file.write(data + '\n')
+        self.log_writer.append([(file_name, data + '\n')])
+
+    def close_outputs(self):
+        if self.telemetry is not None:
+            self.telemetry.close(FINISHED if self.stop_reason is not None else STOPPED)
+        if self.strip_engine is not None:
+            self.strip_engine.close()
+        if self.frame_exporter is not None:
+            self.frame_exporter.close()
+        if self.log_writer is not None:
+            self.log_writer.close()
+            if show_print:
+                print(self.log_writer.report())
 
     # Create one step of the event loop that is to happen. i.e. how the world changes in one step.
     def loop_step(self):
@@ -357,25 +606,29 @@ class Visualise(Realise):
         # # Resetting the world
         # if self.clock.time_step % 5000 == 0:
         #     self.reset()
+        self.sync_padded_layers()
+        if self.batch_sensing:
+            self.sense_colony_likeness()
 
         self.food_collected[self.clock.time_step] = np.zeros(len(self.ant_list))
         self.action_distribution[self.clock.time_step] = np.zeros(len(self.ant_list[0].action_list))
+        colony = self.colony
+        colony.food_collection_history[:] = 0  # For Analysis. will change using time_step.
+        # Else have to repeat the 0 case multiple times.
         # Iterating over all ants.
         for index, ant in enumerate(self.ant_list):
 
-            ant.history['food_collection_history'] = 0  # For Analysis. will change using time_step.
-            # Else have to repeat the 0 case multiple times.
-
             # use random and not np.random to use objects and not a np array.
             # if self.clock.time_step < 50000:
             if True:
                 ant.sense_state('Initial')
-                ant.history['hash_history'] = ant.state_hash  # For Analysis
+                colony.hash_history[index] = colony.rows[ant.state_hash]  # For Analysis
                 ant.perform_action()
-                ant.history['action_history'] = ant.selected_action  # For Analysis
+                action_index = ant.action_list.index(ant.selected_action)
+                colony.action_history[index] = action_index  # For Analysis
                 ant.sense_state('Final')
 
-                self.action_distribution[self.clock.time_step][ant.action_list.index(ant.selected_action)] += 1
+                self.action_distribution[self.clock.time_step][action_index] += 1
 
                 if ant.selected_action in ['drop_home', 'drop_target']:
                     ant.steps_since_pheromone_drop = 0
@@ -392,13 +645,13 @@ class Visualise(Realise):
                         reward = 100
                         # reward = 10
                         ant.has_food = False
-                        ant.cumulative['total_food_count'] += 1  # For Analysis
-                        ant.history['food_collection_history'] = 1  # For Analysis
+                        colony.total_food_count[index] += 1  # For Analysis
+                        colony.food_collection_history[index] = 1  # For Analysis
                         self.food_collected[self.clock.time_step][index] = 1
                     else:
                         reward = -5
                         # reward = -1
-                    ant.history['state_history'] = 'Search_Food'  # For Analysis
+                    colony.state_history[index] = SEARCH_FOOD  # For Analysis
                     # If the ant is home then it must go to the Target.
                 elif ant.position in self.world.layers['Target']:
                     # Experimental, making the ant turn around at target.
@@ -410,34 +663,33 @@ class Visualise(Realise):
                         ant.has_food = True
                         reward = 5
                         # reward = -1
-                    ant.history['state_history'] = 'Search_Home'  # For Analysis
+                    colony.state_history[index] = SEARCH_HOME  # For Analysis
                     # If the ant is at the Target then it must go Home.
                 else:
                     reward = -1
                     # If the ant is neither at Home nor the Target, Then it must keep doing what its doing.
                     # So we do nothing about it.
                     # if this is during the first step, then its achieved state is to search for food.
-                    if len(ant.history['state_history']) == 0:
-                        ant.history['state_history'] = 'Search_Food'  # For Analysis
+                    if colony.state_history[index] == 0:
+                        colony.state_history[index] = SEARCH_FOOD  # For Analysis
                 ant.earn_reward(reward)
                 if learning:
                     ant.learn()
-                # We calculate the average steps taken to get to food.
-                if ant.cumulative['total_food_count'] != 0:  # For Analysis
-                    ant.cumulative['average_steps_before_collection'] = (self.clock.time_step + 1) / ant.cumulative[
-                        'total_food_count']
-                else:
-                    ant.cumulative['average_steps_before_collection'] = -1
-            # Now for each ant we store the history log values.
-            if log:
-                ant_history_data = ','.join(str(value) for value in ant.history.values())
-                self.write_to_file(data=ant_history_data, file_name=f'Ant_{index}.csv')
-                # Not writing brain values unless analysis is run or at the end cause else it's an overkill.
+        # We calculate the average steps taken to get to food.
+        colony.update_averages(self.clock.time_step)  # For Analysis
 
-        self.pheromone_a.decay('Percentage')
-        self.pheromone_b.decay('Percentage')
-        self.pheromone_a.disperse()
-        self.pheromone_b.disperse()
+        self.deposits.flush()
+
+        if self.strip_engine is not None:
+            self.strip_engine.step()
+        else:
+            self.pheromone_a.decay('Percentage')
+            self.pheromone_b.decay('Percentage')
+            self.pheromone_a.disperse()
+            self.pheromone_b.disperse()
+
+        if self.frame_exporter is not None:
+            self.frame_exporter.capture(self.clock.time_step)
 
         # # Let the home and the target give off a very small amount of pheromone
         # for layer_type in ['Home', 'Target']:
@@ -448,17 +700,44 @@ class Visualise(Realise):
         #             self.world.layers['Pheromone_' + layer_type][position[1], position[0]] -= 0.01
 
         # Writing the Cumulative data file.
-        if log:
-            with open(f"Analysis/{self.sim_name}/Log/Cumulative.csv", 'w') as f:
-                f.write('Total_Food_Collected,Average_Steps_Before_Collection\n')
-                for ant in self.ant_list:
-                    f.write(f"{ant.cumulative['total_food_count']},{ant.cumulative['average_steps_before_collection']}\n")
+        if self.log:
+            # Now for each ant we store the history log values.
+            # Not writing brain values unless analysis is run or at the end cause else it's an overkill.
+            self.log_writer.append([(f'Ant_{index}.csv', row) for index, row in enumerate(colony.history_rows())])
+            self.log_writer.overwrite('Cumulative.csv',
+                                      'Total_Food_Collected,Average_Steps_Before_Collection\n' +
+                                      colony.cumulative_rows())
+
+        # Periodic snapshot of the brains for learning curve analysis.
+        if self.log and self.snapshot_every and self.clock.time_step % self.snapshot_every == 0:
+            snapshot_path = f"Analysis/{self.sim_name}/Snapshots"
+            if not os.path.exists(snapshot_path):
+                os.makedirs(snapshot_path)
+            save_snapshot(os.path.join(snapshot_path, f'Brains_{self.clock.time_step}.npz'), self.ant_list,
+                          self.clock.time_step)
 
         if show_print:
             if self.clock.time_step % 5000 == 0:
                 progress_bar(self.clock.time_step, self.max_steps)
 
+        if self.telemetry is not None and self.clock.time_step % self.telemetry.every == 0:
+            self.telemetry.publish(self.clock.time_step, int(self.colony.total_food_count.sum()),
+                                   float(np.mean([ant.brain.exploration_rate for ant in self.ant_list])))
+
         if self.clock.time_step >= self.max_steps:
+            self.stop_reason = 'Max_Steps'
+        elif self.convergence is not None:
+            ant_keys = None
+            if self.convergence.frozen_steps:
+                ant_keys = tuple((ant.current_observed_state, ant.selected_action) for ant in self.ant_list)
+            if self.convergence.observe(self.clock.time_step, self.food_collected[self.clock.time_step].sum(),
+                                        self.action_distribution[self.clock.time_step], ant_keys):
+                self.stop_reason = self.convergence.stop_reason
+                if show_print:
+                    print(f'\n{self.stop_reason} at step {self.clock.time_step}. Stopping early.')
+
+        if self.stop_reason is not None:
+            self.stop_step = self.clock.time_step
             # do not use <a>. to analyse if using kwargs.
             self.analyse()
             if show_print:
@@ -473,31 +752,45 @@ class Visualise(Realise):
         if self.visualise:
             self.setup_layers('Data/Layer_data.csv')
         ###
-        path = "Analysis"
+        path = f"Analysis/{self.sim_name}/Log"
         # Check whether the specified path exists or not
-        if not os.path.exists(path):
+        if self.log and not os.path.exists(path):
             # Create a new directory because it does not exist
             os.makedirs(path)
 
         ###############################################################################################################
         # Analysis Data Files.
-        path = f"Analysis/{self.sim_name}/Log"
-        # Check whether the specified path exists or not
-        if not os.path.exists(path):
-            # Create a new directory because it does not exist
-            os.makedirs(path)
-        if log:
-            for index, ant in enumerate(self.ant_list):
-                df = pd.DataFrame.from_dict(ant.brain.q_table, orient='index',
-                                            columns=ant.action_list)
-                df.index.name = 'State(HasFood_TimeSinceLstPherDrp_HomeLike_TargetLike)'
-                df.reset_index(inplace=True)
-                df.to_csv(f"Analysis/{self.sim_name}/Log/Ant_{index}_Brain.csv", index=False)
+        if self.log:
+            # All the brains go into one compressed file. The csv files are only written if asked for.
+            # They can also be exported later from the snapshot using brain_snapshot.py
+            q_tables, states, actions = save_snapshot(f"Analysis/{self.sim_name}/Log/Brains.npz", self.ant_list,
+                                                      self.clock.time_step)
+            write_labels(f"Analysis/{self.sim_name}/Log/Brain_Labels.csv", states)
+            if self.brain_csv:
+                export_brain_csv(q_tables, states, actions, f"Analysis/{self.sim_name}/Log")
 
         ###############################################################################################################
         food = np.array(list(self.food_collected.values()))
         actions = np.array(list(self.action_distribution.values()), dtype=int)
         self.total_food_collected = np.sum(food)
+        self.projected_food_collected = self.total_food_collected
+        if self.convergence is not None:
+            self.projected_food_collected = self.convergence.projected_food(self.total_food_collected, self.max_steps)
+        if self.log and self.stop_reason is not None:
+            # Record why and when the run ended.
+            with open(f"Analysis/{self.sim_name}/Log/Stop.csv", 'w') as f:
+                f.write('Stop_Reason,Stop_Step,Max_Steps,Total_Food_Collected,Projected_Food_Collected\n')
+                f.write(f'{self.stop_reason},{self.stop_step},{self.max_steps},{self.total_food_collected},'
+                        f'{self.projected_food_collected}\n')
+        if self.log:
+            self.write_run_info(food, actions)
+
+        if not self.log:
+            # Only the results in memory are needed.
+            if show_print:
+                print(self.sim_name + ' Completed!')
+            return
+
         batch_size = 1000
         food_per_batch = {}
         sum_batch = np.zeros_like(food[0])
@@ -564,7 +857,29 @@ if __name__ == "__main__":
                         no_show=args.no_show,
                         start_as=args.start_as,
                         max_steps=args.max_steps,
-                        sim_name=args.sim_name)
+                        sim_name=args.sim_name,
+                        snapshot_every=args.snapshot_every,
+                        brain_csv=not args.no_brain_csv,
+                        frame_every=args.frame_every,
+                        frame_format=args.frame_format,
+                        strip_workers=args.strip_workers,
+                        batch_deposits=not args.immediate_deposits,
+                        likeness_buckets=args.likeness_buckets,
+                        likeness_spacing=args.likeness_spacing,
+                        stop_on_plateau=args.stop_on_plateau,
+                        plateau_windows=args.plateau_windows,
+                        plateau_tolerance=args.plateau_tolerance,
+                        frozen_steps=args.frozen_steps,
+                        warm_start=args.warm_start,
+                        warm_start_average=args.warm_start_average,
+                        warm_start_exploration=args.warm_start_exploration,
+                        warm_start_buckets=args.warm_start_buckets,
+                        warm_start_spacing=args.warm_start_spacing,
+                        telemetry_every=args.telemetry_every,
+                        r_length=args.world_rows,
+                        c_length=args.world_columns,
+                        home=tuple(args.home),
+                        target=tuple(args.target))
     end_time = time.time()
     if show_print:
         print(f'Time for execution :: {end_time - start_time}s')
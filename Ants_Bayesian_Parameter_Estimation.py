@@ -1,6 +1,7 @@
 import multiprocessing
 
 from Ants import *
+from replicates import evaluate_replicates
 
 import time
 import pandas as pd
@@ -17,19 +18,15 @@ def process_loop(dispersion_rate, decay_rate, drop_amount, min_exploration, expl
     try:
         sim_name = str(counter.value)
         counter.value += 1
-        para_realise = Visualise(dispersion_rate=dispersion_rate,
-                                 decay_rate=decay_rate,
-                                 drop_amount=drop_amount,
-                                 min_exploration=min_exploration,
-                                 exploration_rate=exploration_rate,
-                                 exploration_decay=exploration_decay,
-                                 learning_rate=learning_rate,
-                                 discounted_return=discounted_return,
-                                 no_show=True,
-                                 start_as='Play',
-                                 max_steps=700000,
-                                 sim_name=sim_name)
-        total_food = para_realise.total_food_collected
+        max_steps = 700000
+        params = {'dispersion_rate': dispersion_rate, 'decay_rate': decay_rate, 'drop_amount': drop_amount,
+                  'min_exploration': min_exploration, 'exploration_rate': exploration_rate,
+                  'exploration_decay': exploration_decay, 'learning_rate': learning_rate,
+                  'discounted_return': discounted_return}
+        # Points that were already simulated (like x0) are taken from the cache.
+        # Watch the running simulations with python telemetry.py
+        total_food = evaluate_replicates(params, max_steps, sim_name, [sim_seed], write_logs=True,
+                                         telemetry_every=1000)['mean']
         result_dict[sim_name] = [dispersion_rate, decay_rate, drop_amount, min_exploration, exploration_rate,
                                  exploration_decay, learning_rate, discounted_return, total_food]
         return total_food
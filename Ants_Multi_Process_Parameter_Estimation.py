@@ -1,35 +1,34 @@
 import concurrent.futures
 import multiprocessing
 from Ants import *
+from eval_cache import parameter_names
+from replicates import evaluate_replicates
+from prescreen import Prescreener, load_history
+from warm_start import shared_warm_start
 import pickle
 import os
 
 
-def process_loop(index, parameter_dictionary):
+def process_loop(index, parameter_dictionary, warm_start=None):
     try:
         start = time.perf_counter()
         sim_name = (f"Trial_{index}_" +
                     f"Disp_{round(parameter_dictionary['dispersion_rate'][index], 5)}_" +
                     f"Dcy_{round(parameter_dictionary['decay_rate'][index], 5)}"
                     )
-        para_realise = Visualise(dispersion_rate=parameter_dictionary['dispersion_rate'][index],
-                                 decay_rate=parameter_dictionary['decay_rate'][index],
-                                 drop_amount=parameter_dictionary['drop_amount'][index],
-                                 min_exploration=parameter_dictionary['min_exploration'][index],
-                                 exploration_rate=parameter_dictionary['exploration_rate'][index],
-                                 exploration_decay=parameter_dictionary['exploration_decay'][index],
-                                 learning_rate=parameter_dictionary['learning_rate'][index],
-                                 discounted_return=parameter_dictionary['discounted_return'][index],
-                                 no_show=True,
-                                 start_as='Play',
-                                 max_steps=500000,
-                                 sim_name=sim_name)
-        total_food = para_realise.total_food_collected
+        max_steps = 500000
+        params = {name: parameter_dictionary[name][index] for name in parameter_names}
+        # Repeated grid points and reruns after a crash are taken from the cache.
+        # A warm started run is a different scenario for the cache.
+        sim_kwargs = {} if warm_start is None else {'warm_start': warm_start}
+        # Watch the running simulations with python telemetry.py
+        total_food = evaluate_replicates(params, max_steps, sim_name, [sim_seed], write_logs=True,
+                                         telemetry_every=1000, **sim_kwargs)['mean']
         end = time.perf_counter()
         out = f"Sim:: {sim_name}, Completion_Time :: {round(end - start)}, Total_Food :: {total_food}"
-        return out
+        return index, out, total_food
     except Exception as e:
-        return f"Error in simulation {index}: {e}"
+        return index, f"Error in simulation {index}: {e}", None
 
 
 if __name__ == '__main__':
@@ -40,13 +39,43 @@ if __name__ == '__main__':
         parameter_dict = pickle.load(f)
     para_start = time.perf_counter()
 
+    # Candidates that earlier sweeps say collect no food are skipped ('skip') or run last ('deprioritise').
+    # Set prescreen to None to run every candidate in order.
+    prescreen = 'skip'
+    candidates = np.array([parameter_dict[name] for name in parameter_names], dtype=float).T
+    order = range(len(candidates))
+    screener = None
+    if prescreen is not None:
+        screener = Prescreener(seed=sim_seed)
+        if screener.fit(load_history()):
+            order, _ = screener.screen(candidates, mode=prescreen)
+        else:
+            print('Not enough history to pre-screen the candidates. Running all of them.')
+            screener = None
+
+    # Start every simulation from the Q-tables of an earlier run (a Brains.npz snapshot or a Log directory with the
+    # Ant_<i>_Brain.csv files). They are read once and shared with all the workers. None to start from zeros.
+    warm_start_path = None
+    warm_start_average = False  # Start all the ants from the average table of the colony.
+    # Brain.csv files do not record the likeness buckets/spacing they were made with. Give them here, e.g.
+    # likeness_quantizer.quantization_of(LikenessQuantizer(5, 'linear'), LikenessQuantizer(5, 'linear')).
+    # Snapshots record it.
+    warm_start_quantization = None
     # (max_workers=int(os.cpu_count())) use this to reduce lode if needed.
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        results = executor.map(process_loop, range(len(parameter_dict['decay_rate'])),
-                               [parameter_dict] * len(parameter_dict['decay_rate']))
+    with shared_warm_start(warm_start_path, warm_start_average, warm_start_quantization) as warm_start, \
+            concurrent.futures.ProcessPoolExecutor() as executor:
+        results = executor.map(process_loop, order, [parameter_dict] * len(order), [warm_start] * len(order))
+
+        for index, out, total_food in results:
+            print(out)
+            if screener is not None and total_food is not None:
+                screener.record(index, total_food)
 
-        for result in results:
-            print(result)
+    if screener is not None:
+        report = screener.report()
+        print(f"Pre-screen :: Accepted {report['accepted']} of {report['screened']} "
+              f"({round(100 * report['acceptance_rate'], 1)} %), Runs Saved :: {report['runs_saved']}, "
+              f"False Rejects :: {round(100 * report['false_reject_rate'], 1)} % of {report['audited']} audited")
 
     # for i in range(len(parameter_dict['decay_rate'])):
     #     print(process_loop(i, parameter_dict))
@@ -1,6 +1,9 @@
+import concurrent.futures
 import multiprocessing
 
 from Ants import *
+from replicates import evaluate_replicates, replicate_seeds
+from warm_start import shared_warm_start
 
 import time
 import datetime
@@ -9,49 +12,56 @@ import numpy as np
 
 from skopt import Optimizer
 from skopt.space import Real
-from joblib import Parallel, delayed
 
 import matplotlib.pyplot as plt
 
 
-def process_loop(dispersion_rate, decay_rate, drop_amount, min_exploration, exploration_rate, exploration_decay,
-                 learning_rate, discounted_return):
-    global counter
-    global result_dict
-    global batch_name
-
+def process_loop(batch_name, sim_count, replicates, dispersion_rate, decay_rate, drop_amount, min_exploration,
+                 exploration_rate, exploration_decay, learning_rate, discounted_return, warm_start=None):
     try:
-        sim_name = batch_name + '/' + str(counter.value)
-        sim_count = counter.value
-        counter.value += 1
-        para_realise = Visualise(dispersion_rate=dispersion_rate,
-                                 decay_rate=decay_rate,
-                                 drop_amount=drop_amount,
-                                 min_exploration=min_exploration,
-                                 exploration_rate=exploration_rate,
-                                 exploration_decay=exploration_decay,
-                                 learning_rate=learning_rate,
-                                 discounted_return=discounted_return,
-                                 no_show=True,
-                                 start_as='Play',
-                                 max_steps=350000,
-                                 sim_name=sim_name)
-        total_food = para_realise.total_food_collected
+        sim_name = batch_name + '/' + str(sim_count)
+        max_steps = 350000
+        params = {'dispersion_rate': dispersion_rate, 'decay_rate': decay_rate, 'drop_amount': drop_amount,
+                  'min_exploration': min_exploration, 'exploration_rate': exploration_rate,
+                  'exploration_decay': exploration_decay, 'learning_rate': learning_rate,
+                  'discounted_return': discounted_return}
+        # Every point is run with the same seeds (common random numbers) in this process.
+        # Points that were already simulated are taken from the cache.
+        # The warm start handle points to the Q-tables the driver put in shared memory.
+        sim_kwargs = {} if warm_start is None else {'warm_start': warm_start}
+        # Watch the running simulations with python telemetry.py
+        result = evaluate_replicates(params, max_steps, sim_name, replicate_seeds(replicates), write_logs=True,
+                                     telemetry_every=1000, **sim_kwargs)
         # sim_count and sim_name is basically the same apart from a pre-appended batch name.
-        result_dict[sim_count] = [dispersion_rate, decay_rate, drop_amount, min_exploration, exploration_rate,
-                                  exploration_decay, learning_rate, discounted_return, total_food]
-        return total_food
+        return [dispersion_rate, decay_rate, drop_amount, min_exploration, exploration_rate,
+                exploration_decay, learning_rate, discounted_return, result['variance'], result['mean']]
     except Exception as e:
         print(f"Error in simulation : {e}")
         return f"Error in simulation : {e}"
 
 
-def process_loop_obj(params):
+def process_loop_obj(batch_name, sim_count, replicates, params, warm_start=None):
     [dispersion_rate, decay_rate, drop_amount, min_exploration, exploration_rate,
      exploration_decay, learning_rate, discounted_return] = params
-    result = process_loop(dispersion_rate, decay_rate, drop_amount, min_exploration, exploration_rate,
-                          exploration_decay, learning_rate, discounted_return)
-    return -result
+    return process_loop(batch_name, sim_count, replicates, dispersion_rate, decay_rate, drop_amount, min_exploration,
+                        exploration_rate, exploration_decay, learning_rate, discounted_return, warm_start)
+
+
+def ask_one(optimizer, pending_points):
+    """
+    Asks the optimizer for one new point while other points are still being evaluated.
+    The pending points are told to a copy of the optimizer with a made up (constant liar) value, the best value seen
+    so far, so that the new point is not the same as the ones already running.
+    :param optimizer: The skopt Optimizer.
+    :param pending_points: Points that have been dispatched but have no result yet.
+    :return: The new point.
+    """
+    if len(pending_points) == 0:
+        return optimizer.ask()
+    liar_value = min(optimizer.yi) if len(optimizer.yi) != 0 else 0.0
+    liar = optimizer.copy(random_state=optimizer.rng)
+    liar.tell(pending_points, [liar_value] * len(pending_points))
+    return liar.ask()
 
 
 def printable_time(seconds):
@@ -118,6 +128,21 @@ if __name__ == '__main__':
 
     # If cores are low then increase the number of iterations.
     max_iterations = 30  # No. of Optimization iterations (works well for at least 40 cores not so much for 8)
+    # The optimization is asynchronous, a new point is asked for as soon as any simulation finishes.
+    # So the iterations are only used to decide the total number of simulations.
+    max_evaluations = max_iterations * n_jobs
+
+    # Number of seeds each point is run with. The mean food is optimized and the variance is saved along with it.
+    replicates = 1
+
+    # Start every simulation from the Q-tables of an earlier run (a Brains.npz snapshot or a Log directory with the
+    # Ant_<i>_Brain.csv files) instead of all zeros. None to start from zeros.
+    warm_start_path = None
+    warm_start_average = False  # Start all the ants from the average table of the colony.
+    # Brain.csv files do not record the likeness buckets/spacing they were made with. Give them here, e.g.
+    # likeness_quantizer.quantization_of(LikenessQuantizer(5, 'linear'), LikenessQuantizer(5, 'linear')).
+    # Snapshots record it.
+    warm_start_quantization = None
 
     ####################################################################################################################
 
@@ -135,6 +160,9 @@ if __name__ == '__main__':
         f.write(f"- Random Seed          :: {seed}\n")
         f.write(f"- Number of Cores      :: {n_jobs}\n")
         f.write(f"- Number of Iterations :: {max_iterations}\n")
+        f.write(f"- Number of Simulations :: {max_evaluations}\n")
+        f.write(f"- Replicates per Point :: {replicates}\n")
+        f.write(f"- Warm Start           :: {warm_start_path}\n")
 
     ####################################################################################################################
 
@@ -153,10 +181,7 @@ if __name__ == '__main__':
 
     ####################################################################################################################
 
-    # Create shared dictionary and counter using Manager
-    manager = multiprocessing.Manager()
-    result_dict = manager.dict()
-    counter = manager.Value('i', 1)
+    result_dict = {}  # {sim_count: [parameters..., total_food]}
 
     ####################################################################################################################
 
@@ -167,25 +192,47 @@ if __name__ == '__main__':
 
     ####################################################################################################################
 
-    # Use Bayesian optimization to find the optimum parameters
-    for i in range(max_iterations):
-        loop_start = time.perf_counter()
-        print(f'Round {i + 1} of {max_iterations}')
-        x = optimizer.ask(n_points=n_jobs)  # x is a list of n_points points
-        y = Parallel(n_jobs=n_jobs)(delayed(process_loop_obj)(v) for v in x)  # evaluate points in parallel
-        optimizer.tell(x, y)
-        df = pd.DataFrame.from_dict(result_dict, orient='index',
-                                    columns=['dispersion_rate', 'decay_rate', 'drop_amount', 'min_exploration',
-                                             'exploration_rate', 'exploration_decay', 'learning_rate',
-                                             'discounted_return', 'total_food'])
-        df.to_csv(f'Analysis/{batch_name}/0_Parameters.csv', index_label='sim_name')
-        loop_end = time.perf_counter()
-        run_time = loop_end - loop_start
-        eta = run_time * (max_iterations - (i + 1))
-        print(f'Time taken for round {i + 1} = {printable_time(run_time)}')
-        print(f'Estimated Time Remaining :: {printable_time(eta)}')
-        print(f'Would Probably Finish at :: {now_plus_time(eta)}')
-        print('-' * 100)
+    # Use Bayesian optimization to find the optimum parameters.
+    # Every worker is kept busy. When a simulation finishes its result is told to the optimizer and a new point
+    # is asked for straight away instead of waiting for the slowest simulation of a round.
+    # The warm start is read once and shared with all the workers.
+    with shared_warm_start(warm_start_path, warm_start_average, warm_start_quantization) as warm_start, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = {}  # {future: (sim_count, point)}
+        submitted = 0
+        completed = 0
+        while submitted < max_evaluations or len(pending) != 0:
+            # Keep all the workers busy.
+            while len(pending) < n_jobs and submitted < max_evaluations:
+                submitted += 1
+                point = ask_one(optimizer, [x for _, x in pending.values()])
+                pending[executor.submit(process_loop_obj, batch_name, submitted, replicates, point,
+                                         warm_start)] = (submitted, point)
+
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                sim_count, x = pending.pop(future)
+                result = future.result()
+                completed += 1
+                if isinstance(result, str):
+                    # The simulation failed. Nothing to tell the optimizer.
+                    print(f'Sim {sim_count} failed ({completed} of {max_evaluations}) :: {result}')
+                else:
+                    optimizer.tell(x, -result[-1])
+                    result_dict[sim_count] = result
+                    df = pd.DataFrame.from_dict(result_dict, orient='index',
+                                                columns=['dispersion_rate', 'decay_rate', 'drop_amount',
+                                                         'min_exploration', 'exploration_rate', 'exploration_decay',
+                                                         'learning_rate', 'discounted_return', 'food_variance',
+                                                         'total_food'])
+                    df.sort_index().to_csv(f'Analysis/{batch_name}/0_Parameters.csv', index_label='sim_name')
+                    print(f'Sim {sim_count} finished ({completed} of {max_evaluations}) :: Total Food = {result[-1]}')
+
+                run_time = time.perf_counter() - para_start
+                eta = run_time / completed * (max_evaluations - completed)
+                print(f'Estimated Time Remaining :: {printable_time(eta)}')
+                print(f'Would Probably Finish at :: {now_plus_time(eta)}')
+                print('-' * 100)
 
     ####################################################################################################################
 
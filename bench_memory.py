@@ -0,0 +1,120 @@
+import sys
+command_line = sys.argv
+sys.argv = command_line[:1]  # Ants.py reads the command line when imported.
+from Ants import Ant
+sys.argv = command_line
+from mnest.Environment import World
+from mnest.Entities import Agent
+from mnest.Laws import *
+from colony_state import ColonyState
+from likeness_quantizer import LikenessQuantizer, state_hashes
+from pheromone_deposits import PheromoneDeposits
+import numpy as np
+import tracemalloc
+import argparse
+import gc
+
+"""
+Memory used per ant.
+
+Measures the bytes allocated for each ant with the colony arrays (Ant) and with the layout the ants had before,
+where every ant carried its own dictionaries (LegacyAnt below).
+The saving comes from the Q-tables: a dictionary of one small array per state for every ant before, rows of one
+colony array after. The ant objects themselves (Agent, Brain and their __dict__) are about the same size in both.
+
+Run like this::
+python bench_memory.py --ants=10000
+"""
+
+
+class LegacyAnt(Agent):
+    # The data an ant used to carry, kept here only to compare against.
+    def __init__(self, world, layer_name, position, quantizer):
+        super().__init__(world=world, layer_name=layer_name, child=self, position=position,
+                         action_list=['move_random', 'go_home', 'go_target', 'drop_home', 'drop_target'])
+        self.direction = Vector2(*self.direction)
+        self.has_food = False
+        self.steps_since_pheromone_drop = 0
+        self.home_likeness = 1
+        self.target_likeness = 0
+        self.likeness_sensed = False
+        self.home_quantizer = quantizer
+        self.target_quantizer = quantizer
+        self.max_states = 2 * 5 * quantizer.buckets * quantizer.buckets
+        self.state_hash = 'False_0_1_0'
+        self.drop_amount = 0.05
+        self.deposits = None
+        self.history = {'hash_history': 'False_0_1_0', 'action_history': 'move_random',
+                        'state_history': 'Search_Food', 'food_collection_history': 0}
+        self.cumulative = {'total_food_count': 0, 'average_steps_before_collection': 0}
+        full_state_table = {state: np.zeros(len(self.action_list)) for state in state_hashes(quantizer, quantizer)}
+        self.brain.q_table = dict(sorted(full_state_table.items()))
+
+
+def bytes_per_ant(make_ants, n_ants, q_table_bytes):
+    """
+    :param make_ants: Function making n_ants ants.
+    :param q_table_bytes: Function giving the bytes of the Q-tables of what make_ants made.
+    :return: (bytes per ant, bytes of the Q-tables per ant)
+    """
+    gc.collect()
+    tracemalloc.start()
+    ants = make_ants(n_ants)
+    gc.collect()
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    q_tables = q_table_bytes(ants)
+    del ants
+    return allocated / n_ants, q_tables / n_ants
+
+
+def legacy_q_table_bytes(ants):
+    # The dictionary of every ant with its state keys and value arrays.
+    return sum(sys.getsizeof(ant.brain.q_table) +
+               sum(sys.getsizeof(state) + sys.getsizeof(values) for state, values in ant.brain.q_table.items())
+               for ant in ants)
+
+
+def colony_bytes(colony_and_ants):
+    # All the arrays of the colony (the Q-tables, history and cumulative data of every ant).
+    colony, _ants = colony_and_ants
+    return sum(value.nbytes for value in vars(colony).values() if isinstance(value, np.ndarray))
+
+
+def make_world():
+    layers = {'Pheromone_Target': ['Float', (250, 10, 50), 'None', 1],
+              'Pheromone_Home': ['Float', (85, 121, 207), 'None', 1],
+              'Ants': ['Block', (255, 0, 0), 'None']}
+    return World(layer_data=layers, r_length=30, c_length=30)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the memory used per ant.')
+    parser.add_argument('--ants', type=int, default=1000, help='Number of ants to create')
+    args = parser.parse_args()
+
+    quantizer = LikenessQuantizer()
+
+    def legacy_ants(n_ants):
+        world = make_world()
+        return [LegacyAnt(world, 'Ants', Vector2(0, 0), quantizer) for _ in range(n_ants)]
+
+    def compact_ants(n_ants):
+        world = make_world()
+        deposits = PheromoneDeposits(world)
+        colony = ColonyState(n_ants, quantizer, quantizer,
+                             ['move_random', 'go_home', 'go_target', 'drop_home', 'drop_target'])
+        return colony, [Ant(world=world, layer_name='Ants', position=Vector2(0, 0), deposits=deposits,
+                            home_quantizer=quantizer, target_quantizer=quantizer, colony=colony, index=index)
+                        for index in range(n_ants)]
+
+    before, before_tables = bytes_per_ant(legacy_ants, args.ants, legacy_q_table_bytes)
+    after, after_tables = bytes_per_ant(compact_ants, args.ants, colony_bytes)
+    print(f'Ants :: {args.ants}')
+    print(f'Bytes per Ant (Before) :: {round(before)}')
+    print(f'    Q-table dictionaries :: {round(before_tables)}')
+    print(f'    Rest of the ant      :: {round(before - before_tables)}')
+    print(f'Bytes per Ant (After)  :: {round(after)}')
+    print(f'    Colony arrays        :: {round(after_tables)}')
+    print(f'    Rest of the ant      :: {round(after - after_tables)}')
+    print(f'Reduction :: {round(before / after, 1)}x')
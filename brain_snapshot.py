@@ -0,0 +1,107 @@
+import argparse
+import numpy as np
+import pandas as pd
+import json
+import os
+
+"""
+Compact storage for the Q-tables of a whole colony.
+
+All the brains are stored in one compressed .npz file holding a single (ants x states x actions) array along with
+the labels needed to read it back (state hashes and action names). The per ant Brain.csv files can then be exported
+from a snapshot only when they are actually needed.
+
+Export the csv files of a saved snapshot like this::
+python brain_snapshot.py Analysis/Hope_this_works/Log/Brains.npz
+"""
+
+# Name of the index column used in the Ant_<i>_Brain.csv files.
+state_label = 'State(HasFood_TimeSinceLstPherDrp_HomeLike_TargetLike)'
+
+
+def colony_q_tables(ant_list):
+    """
+    Copies the Q-tables of the ants into one array.
+    All the ants of a colony have the same states, so this is a copy of their rows of the colony array.
+    :param ant_list: List of ants whose Q-tables are to be stacked.
+    :return: (q_tables, states, actions) where q_tables has the shape (ants, states, actions).
+    """
+    colony = ant_list[0].colony
+    return colony.q_tables[[ant.index for ant in ant_list]], list(colony.states), list(colony.action_list)
+
+
+def save_snapshot(file_path, ant_list, time_step):
+    """
+    Saves the Q-tables of all the ants into one compressed .npz file.
+    :param file_path: Path of the .npz file (Include extension).
+    :param ant_list: List of ants to be saved.
+    :param time_step: The time step at which the snapshot is taken.
+    :return: (q_tables, states, actions) as saved.
+    """
+    q_tables, states, actions = colony_q_tables(ant_list)
+    # The likeness buckets/spacing and the drop timer decide what each state hash means.
+    quantization = ant_list[0].colony.quantization
+    np.savez_compressed(file_path, q_tables=q_tables, states=np.array(states), actions=np.array(actions),
+                        time_step=time_step, quantization=json.dumps(quantization))
+    return q_tables, states, actions
+
+
+def load_snapshot(file_path):
+    """
+    Loads a snapshot saved by save_snapshot.
+    :param file_path: Path of the .npz file.
+    :return: (q_tables, states, actions, time_step)
+    """
+    with np.load(file_path) as data:
+        return data['q_tables'], list(data['states']), list(data['actions']), int(data['time_step'])
+
+
+def load_quantization(file_path):
+    """
+    :param file_path: Path of the .npz file.
+    :return: The quantization the snapshot was saved with (likeness_quantizer.quantization_of()), or None for
+             snapshots saved before it was recorded.
+    """
+    with np.load(file_path) as data:
+        if 'quantization' not in data.files:
+            return None
+        return json.loads(str(data['quantization']))
+
+
+def write_labels(file_path, states):
+    # The labels table maps the state axis of the snapshot array to the state hashes.
+    pd.DataFrame({state_label: states}).to_csv(file_path, index_label='State_Index')
+
+
+def write_brain_csv(file_path, q_table, states, actions):
+    df = pd.DataFrame(q_table, columns=actions)
+    df.insert(0, state_label, states)
+    df.to_csv(file_path, index=False)
+
+
+def export_brain_csv(q_tables, states, actions, dir_path):
+    """
+    Writes the Ant_<i>_Brain.csv files in the same format as before, one file per ant.
+    :param q_tables: (ants x states x actions) array.
+    :param states: State hashes for the second axis.
+    :param actions: Action names for the third axis.
+    :param dir_path: Directory where the csv files are written.
+    :return:
+    """
+    for index, q_table in enumerate(q_tables):
+        write_brain_csv(os.path.join(dir_path, f'Ant_{index}_Brain.csv'), q_table, states, actions)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the Brain csv files from a Q-table snapshot.')
+    parser.add_argument('snapshot', type=str, help='Path to the .npz snapshot')
+    parser.add_argument('--out_dir', type=str, default=None,
+                        help='Directory for the csv files (Defaults to the directory of the snapshot)')
+    args = parser.parse_args()
+
+    out_dir = args.out_dir if args.out_dir is not None else os.path.dirname(args.snapshot)
+    if not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+    snapshot_q_tables, snapshot_states, snapshot_actions, snapshot_step = load_snapshot(args.snapshot)
+    export_brain_csv(snapshot_q_tables, snapshot_states, snapshot_actions, out_dir)
+    print(f'Exported {len(snapshot_q_tables)} brains from step {snapshot_step} to {out_dir}')
@@ -0,0 +1,127 @@
+from collections.abc import Mapping
+from mnest.Entities import Brain
+from likeness_quantizer import state_hashes, quantization_of
+import numpy as np
+
+"""
+Compact storage for the data of every ant in a colony.
+
+Instead of each ant carrying its own dictionaries (a Q-table of one small array per state, the history and the
+cumulative data rewritten key by key every step), the colony keeps one preallocated array for each of them with a
+row per ant. The ants only keep their position, direction and a few numbers.
+The Q-table of an ant is a read/write view of its rows of the colony array, so the brain works on it as before.
+"""
+
+# Codes of the state achieved, as stored in the history.
+SEARCH_STATES = ['', 'Search_Food', 'Search_Home']
+SEARCH_FOOD = 1
+SEARCH_HOME = 2
+
+
+class QTableView(Mapping):
+    """
+    The Q-table of one ant. Works like the dictionary the brain expects (state hash -> array of action values),
+    but the values are rows of the colony array and the states are shared with the rest of the colony.
+    """
+    __slots__ = ('table', 'rows')
+
+    def __init__(self, table, rows):
+        self.table = table  # (states x actions) view of the colony array.
+        self.rows = rows  # {state hash: row}, shared by all the ants.
+
+    def __getitem__(self, state):
+        return self.table[self.rows[state]]
+
+    def __contains__(self, state):
+        return state in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class ColonyBrain(Brain):
+    # The Brain of MNEST, with its q_table being a QTableView of the colony array.
+    def add_state(self, state: str):
+        # All the states are made with the colony. A new one means the state hash is wrong.
+        raise KeyError(f'Unknown state {state}.')
+
+
+class ColonyState:
+    def __init__(self, n_ants, home_quantizer, target_quantizer, action_list, drop_timer=5):
+        """
+        :param n_ants: Number of ants in the colony.
+        :param home_quantizer: LikenessQuantizer of the home likeness.
+        :param target_quantizer: LikenessQuantizer of the target likeness.
+        :param action_list: Actions of the ants.
+        :param drop_timer: Number of values of the time since the last pheromone drop.
+        """
+        self.n_ants = n_ants
+        self.action_list = list(action_list)
+        # How the likeness is turned into states. Saved with the Q-tables so that they are only loaded into a colony
+        # with the same states.
+        self.quantization = quantization_of(home_quantizer, target_quantizer, drop_timer)
+        # The states are in the same sorted order the Q-tables always had.
+        self.states = sorted(state_hashes(home_quantizer, target_quantizer, drop_timer))
+        self.rows = {state: row for row, state in enumerate(self.states)}
+        # State hash of each combination of [has_food][time since drop][home likeness][target likeness].
+        # The ants look their hash up here instead of building a new string every step.
+        self.labels = [[[[self.states[self.rows[f'{has_food}_{time_drop}_{like_home}_{like_target}']]
+                          for like_target in range(target_quantizer.buckets)]
+                         for like_home in range(home_quantizer.buckets)]
+                        for time_drop in range(drop_timer)]
+                       for has_food in [False, True]]
+
+        self.q_tables = np.zeros((n_ants, len(self.states), len(self.action_list)))
+
+        # History (what happened in the last step).
+        self.hash_history = np.full(n_ants, -1, dtype=np.int32)  # Row of the state that caused the action.
+        self.action_history = np.full(n_ants, -1, dtype=np.int8)  # Index of the action taken.
+        self.state_history = np.zeros(n_ants, dtype=np.int8)  # Code in SEARCH_STATES of the state achieved.
+        self.food_collection_history = np.zeros(n_ants, dtype=np.int8)  # 1 if food was collected in this step.
+
+        # Cumulative Data
+        self.total_food_count = np.zeros(n_ants, dtype=np.int64)
+        self.average_steps_before_collection = np.zeros(n_ants)  # -1 until the first food is collected.
+
+    def q_table(self, index):
+        return QTableView(self.q_tables[index], self.rows)
+
+    def update_averages(self, time_step):
+        # Steps per food collected of every ant.
+        collected = self.total_food_count != 0
+        self.average_steps_before_collection[:] = -1
+        self.average_steps_before_collection[collected] = (time_step + 1) / self.total_food_count[collected]
+
+    def history(self, index):
+        return {'hash_history': self.states[self.hash_history[index]] if self.hash_history[index] >= 0 else '',
+                'action_history': self.action_list[self.action_history[index]] if self.action_history[index] >= 0
+                else '',
+                'state_history': SEARCH_STATES[self.state_history[index]],
+                'food_collection_history': int(self.food_collection_history[index])}
+
+    def cumulative(self, index):
+        average = float(self.average_steps_before_collection[index])
+        return {'total_food_count': int(self.total_food_count[index]),
+                'average_steps_before_collection': -1 if average == -1 else average}
+
+    def history_rows(self):
+        """
+        :return: The history of every ant as a row of its Ant_<i>.csv file.
+        """
+        # -1 (nothing yet) picks the '' at the end.
+        states = self.states + ['']
+        actions = self.action_list + ['']
+        return [f'{states[state]},{actions[action]},{SEARCH_STATES[search]},{food}\n'
+                for state, action, search, food in zip(self.hash_history.tolist(), self.action_history.tolist(),
+                                                       self.state_history.tolist(),
+                                                       self.food_collection_history.tolist())]
+
+    def cumulative_rows(self):
+        """
+        :return: The rows of Cumulative.csv.
+        """
+        return ''.join(f"{cumulative['total_food_count']},{cumulative['average_steps_before_collection']}\n"
+                       for cumulative in map(self.cumulative, range(self.n_ants)))
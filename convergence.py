@@ -0,0 +1,113 @@
+import numpy as np
+
+"""
+Online stopping criteria for a run.
+
+The food collected and the actions taken are summed over windows of steps (the same 1000 step batches that analyse
+plots). A run has plateaued when, over the last plateau_windows windows compared to the plateau_windows before them,
+the food per window changed by less than the tolerance (relative) and the mix of actions moved by less than the
+tolerance (total variation distance).
+A run is frozen when every ant has sensed the same state and taken the same action for frozen_steps steps in a row.
+"""
+
+
+class ConvergenceMonitor:
+    def __init__(self, n_actions, window=1000, plateau_windows=5, tolerance=0.05, min_windows=20, frozen_steps=0,
+                 check_plateau=True):
+        """
+        :param n_actions: Number of actions of the ants.
+        :param window: Steps per window.
+        :param plateau_windows: Number of windows compared on each side.
+        :param tolerance: Largest change that still counts as a plateau.
+        :param min_windows: The run is never stopped for a plateau before this many windows.
+        :param frozen_steps: Steps with no change in any ant before the run counts as frozen. 0 to disable.
+        :param check_plateau: Set to False to only check for frozen runs.
+        """
+        self.window = window
+        self.plateau_windows = plateau_windows
+        self.tolerance = tolerance
+        self.min_windows = max(min_windows, 2 * plateau_windows)
+        self.frozen_steps = frozen_steps
+        self.check_plateau = check_plateau
+
+        self.window_food = []  # Food collected in each completed window.
+        self.window_actions = []  # Actions taken in each completed window.
+        self.food = 0
+        self.actions = np.zeros(n_actions)
+        self.steps_in_window = 0
+
+        self.last_ant_keys = None
+        self.unchanged_steps = 0
+
+        self.stop_reason = None
+        self.stop_step = None
+
+    def observe(self, time_step, food, actions, ant_keys=None):
+        """
+        Adds one step to the statistics.
+        :param time_step: The current step.
+        :param food: Food collected by the colony in this step.
+        :param actions: Count of each action in this step.
+        :param ant_keys: (state, action) of every ant in this step. Only needed to check for frozen runs.
+        :return: True if the run should stop.
+        """
+        self.food += food
+        self.actions += actions
+        self.steps_in_window += 1
+
+        if self.frozen_steps and ant_keys is not None:
+            if ant_keys == self.last_ant_keys:
+                self.unchanged_steps += 1
+            else:
+                self.unchanged_steps = 0
+                self.last_ant_keys = ant_keys
+            if self.unchanged_steps >= self.frozen_steps:
+                return self.stop('Frozen', time_step)
+
+        if self.steps_in_window == self.window:
+            self.window_food.append(self.food)
+            self.window_actions.append(self.actions)
+            self.food = 0
+            self.actions = np.zeros_like(self.actions)
+            self.steps_in_window = 0
+            if self.check_plateau and self.has_plateaued():
+                return self.stop('Plateau', time_step)
+        return False
+
+    def has_plateaued(self):
+        if len(self.window_food) < self.min_windows:
+            return False
+        k = self.plateau_windows
+        recent_food = np.mean(self.window_food[-k:])
+        previous_food = np.mean(self.window_food[-2 * k:-k])
+        food_change = abs(recent_food - previous_food) / max(recent_food, previous_food, 1)
+
+        recent_actions = np.sum(self.window_actions[-k:], axis=0)
+        previous_actions = np.sum(self.window_actions[-2 * k:-k], axis=0)
+        action_change = 0.5 * np.abs(recent_actions / recent_actions.sum() -
+                                     previous_actions / previous_actions.sum()).sum()
+        return food_change < self.tolerance and action_change < self.tolerance
+
+    def stop(self, reason, time_step):
+        self.stop_reason = reason
+        self.stop_step = time_step
+        return True
+
+    def projected_food(self, total_food, max_steps):
+        """
+        Food the run would have collected by max_steps if it had kept going at its recent rate.
+        This keeps runs that stopped early comparable with full runs.
+        :param total_food: Food collected until the run stopped.
+        :param max_steps: Steps the run was meant to go for.
+        :return:
+        """
+        if self.stop_step is None:
+            return total_food
+        if self.stop_reason == 'Frozen' or len(self.window_food) == 0:
+            # Nothing changes any more, so use the rate since the last window.
+            steps = self.steps_in_window if self.steps_in_window else self.window
+            food = self.food if self.steps_in_window else self.window_food[-1]
+        else:
+            steps = self.window * min(self.plateau_windows, len(self.window_food))
+            food = np.sum(self.window_food[-self.plateau_windows:])
+        return total_food + food / steps * max(max_steps - self.stop_step, 0)
@@ -0,0 +1,139 @@
+import importlib.metadata
+import tempfile
+import hashlib
+import json
+import time
+import os
+
+"""
+On disk cache of simulation results.
+
+Every evaluation is stored under a hash of everything that decides its result: the eight parameters (rounded to a
+set precision), max_steps, the random seed, the scenario and the version of the simulation code. Running the same
+point again (the x0 of the optimizers, repeated grid points, reruns after a crash) returns the stored metrics
+instead of running the whole simulation again.
+The oldest used entries are removed once the cache gets bigger than max_bytes.
+"""
+
+parameter_names = ['dispersion_rate', 'decay_rate', 'drop_amount', 'min_exploration', 'exploration_rate',
+                   'exploration_decay', 'learning_rate', 'discounted_return']
+
+# Source files that change the result of a simulation.
+simulation_files = ['Ants.py', 'pheromone_deposits.py', 'likeness_quantizer.py', 'strip_pheromone.py',
+                    'colony_state.py', 'warm_start.py', 'convergence.py']
+
+
+def code_version():
+    """
+    :return: Hash of the simulation source files and the installed MNEST version.
+    """
+    code_hash = hashlib.sha256()
+    for file_name in simulation_files:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name), 'rb') as f:
+            code_hash.update(f.read())
+    try:
+        code_hash.update(importlib.metadata.version('mnest').encode())
+    except importlib.metadata.PackageNotFoundError:
+        pass
+    return code_hash.hexdigest()
+
+
+class EvalCache:
+    def __init__(self, dir_path='Analysis/Eval_Cache', precision=6, max_bytes=100_000_000):
+        """
+        :param dir_path: Directory where the entries are stored (one json file per entry).
+        :param precision: Number of decimals the parameters are rounded to before hashing.
+        :param max_bytes: Maximum size of the cache on disk.
+        """
+        self.dir_path = dir_path
+        self.precision = precision
+        self.max_bytes = max_bytes
+        self.code_version = code_version()
+        # Check whether the specified path exists or not
+        if not os.path.exists(dir_path):
+            # Create a new directory because it does not exist
+            os.makedirs(dir_path, exist_ok=True)
+
+    def key(self, params, max_steps, seed, scenario):
+        """
+        :param params: Dictionary with the eight parameters.
+        :return: The key of the evaluation.
+        """
+        description = {'params': [round(float(params[name]), self.precision) for name in parameter_names],
+                       'max_steps': int(max_steps),
+                       'seed': seed,
+                       'scenario': scenario,
+                       'code_version': self.code_version}
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        """
+        :return: The stored metrics or None if the evaluation is not in the cache.
+        """
+        path = os.path.join(self.dir_path, key + '.json')
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # Mark it as recently used so that it is evicted last.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another worker since it was read. The metrics are still good.
+            pass
+        return entry['metrics']
+
+    def put(self, key, metrics, **info):
+        """
+        Stores the metrics of an evaluation. Any extra info (like the parameters) is stored along with it.
+        """
+        entry = {'metrics': metrics, 'time': time.time(), **info}
+        # Write to a temporary file first so that parallel workers never read half an entry.
+        with tempfile.NamedTemporaryFile('w', dir=self.dir_path, suffix='.tmp', delete=False) as f:
+            json.dump(entry, f)
+        os.replace(f.name, os.path.join(self.dir_path, key + '.json'))
+        self.evict()
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.dir_path):
+            if entry.name.endswith('.json'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Removed by another worker.
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total_bytes = sum(size for _, size, _ in entries)
+        # Remove the least recently used entries first.
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+
+def cached_evaluation(params, max_steps, seed, scenario, evaluate, cache=None):
+    """
+    Returns the metrics of an evaluation from the cache or runs it and stores the result.
+    :param params: Dictionary with the eight parameters.
+    :param max_steps: Steps of the simulation.
+    :param seed: Random seed of the simulation.
+    :param scenario: Name of the world the simulation runs in.
+    :param evaluate: Function that runs the simulation and returns a dictionary of metrics.
+    :param cache: EvalCache to use. A default one is made if not given.
+    :return: Dictionary of metrics.
+    """
+    if cache is None:
+        cache = EvalCache()
+    key = cache.key(params, max_steps, seed, scenario)
+    metrics = cache.get(key)
+    if metrics is None:
+        metrics = evaluate()
+        cache.put(key, metrics, params={name: float(params[name]) for name in parameter_names},
+                  max_steps=max_steps, seed=seed, scenario=scenario)
+    return metrics
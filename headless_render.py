@@ -0,0 +1,93 @@
+import matplotlib.pyplot as plt
+import numpy as np
+import os
+
+"""
+Headless renderer for the world.
+
+This draws the layers of the world straight from the numpy arrays (no pygame window or display needed) using the same
+colours and the same drawing order as the MNEST visualiser, i.e. the order of the layers in layer_data.
+Float layers are blended on top with a transparency of value/max_value and Block layers are drawn as solid cells.
+"""
+
+
+def render_world(world, layer_names, background=(255, 255, 255)):
+    """
+    Renders the world into an RGB image with one pixel per cell.
+    :param world: The world to be rendered.
+    :param layer_names: Names of the layers to be drawn. They are drawn in the order of world.layer_data.
+    :param background: Colour of the background (R, G, B).
+    :return: uint8 array of shape (r_length, c_length, 3)
+    """
+    frame = np.empty((world.r_length, world.c_length, 3))
+    frame[:] = background
+    for layer_name in world.layer_data:
+        if layer_name not in layer_names:
+            continue
+        layer_type, color = world.layer_data[layer_name][:2]
+        layer_values = world.layers[layer_name]
+        if layer_type == 'Float':
+            alpha = np.clip(layer_values / world.layer_data[layer_name][3], 0, 1)[..., np.newaxis]
+            frame *= 1 - alpha
+            frame += alpha * np.array(color)
+        elif layer_type == 'Block':
+            if len(layer_values) == 0:
+                continue
+            # Blocks are stored as [x, y] (lists or Vector2)
+            cells = np.array([[cell[0], cell[1]] for cell in layer_values], dtype=int)
+            frame[cells[:, 1], cells[:, 0]] = color
+    return frame.astype(np.uint8)
+
+
+class FrameExporter:
+    def __init__(self, world, dir_path, every, frame_format='png', cell_size=1,
+                 layer_names=('Pheromone_Target', 'Pheromone_Home', 'Ants', 'Home', 'Target'),
+                 background=(255, 255, 255)):
+        """
+        Saves a frame of the world every few steps.
+        :param world: The world to be rendered.
+        :param dir_path: Directory in which the frames are saved.
+        :param every: A frame is saved every <every> steps.
+        :param frame_format: 'png' for an image sequence (Frame_<step>.png)
+                             or 'npy' for one (frames x rows x columns x 3) stack (Frames.npy + Frame_Steps.npy)
+        :param cell_size: Pixels per cell for the png images.
+        :param layer_names: The layers to be drawn.
+        :param background: Colour of the background (R, G, B).
+        """
+        if frame_format not in ['png', 'npy']:
+            raise ValueError(f"Unknown frame format '{frame_format}'. Use 'png' or 'npy'.")
+        self.world = world
+        self.dir_path = dir_path
+        self.every = every
+        self.frame_format = frame_format
+        self.cell_size = cell_size
+        self.layer_names = layer_names
+        self.background = background
+
+        # Only used for the npy stack.
+        self.frames = []
+        self.steps = []
+
+        # Check whether the specified path exists or not
+        if not os.path.exists(dir_path):
+            # Create a new directory because it does not exist
+            os.makedirs(dir_path)
+
+    def capture(self, time_step):
+        if time_step % self.every != 0:
+            return
+        frame = render_world(self.world, self.layer_names, self.background)
+        if self.frame_format == 'png':
+            if self.cell_size > 1:
+                frame = np.repeat(np.repeat(frame, self.cell_size, axis=0), self.cell_size, axis=1)
+            plt.imsave(os.path.join(self.dir_path, f'Frame_{time_step:08d}.png'), frame)
+        else:
+            self.frames.append(frame)
+            self.steps.append(time_step)
+
+    def close(self):
+        if self.frame_format == 'npy' and len(self.frames) != 0:
+            np.save(os.path.join(self.dir_path, 'Frames.npy'), np.stack(self.frames))
+            np.save(os.path.join(self.dir_path, 'Frame_Steps.npy'), np.array(self.steps))
+            self.frames = []
+            self.steps = []
@@ -0,0 +1,73 @@
+import bisect
+import numpy as np
+
+"""
+Turns how much a cell is like Home/Target (0 to 1) into one of a fixed number of buckets for the state of the ant.
+
+With linear spacing the buckets are equal parts of 0 to 1. With log spacing the edges are spaced evenly on a log
+scale from log_floor to 1, which gives more buckets to the faint trails.
+Anything at or above the last edge (including the Home/Target cells themselves, likeness 1) is in the top bucket.
+"""
+
+
+class LikenessQuantizer:
+    def __init__(self, buckets=5, spacing='linear', log_floor=1e-3):
+        """
+        :param buckets: Number of buckets.
+        :param spacing: 'linear' or 'log'.
+        :param log_floor: Likeness below this is in the lowest bucket when using log spacing.
+        """
+        if buckets < 1:
+            raise ValueError('There must be at least 1 bucket.')
+        if spacing == 'linear':
+            edges = np.linspace(0, 1, buckets + 1)[1:-1]
+        elif spacing == 'log':
+            edges = np.geomspace(log_floor, 1, buckets)[:-1] if buckets > 1 else np.array([])
+        else:
+            raise ValueError(f"Unknown spacing '{spacing}'. Use 'linear' or 'log'.")
+        self.buckets = buckets
+        self.spacing = spacing
+        self.edges = edges  # The buckets - 1 inner edges.
+        self.edge_list = edges.tolist()
+
+    def bucket(self, likeness):
+        # For a single value. Same as np.digitize.
+        return bisect.bisect_right(self.edge_list, likeness)
+
+    def buckets_of(self, likeness):
+        # For an array of values.
+        return np.digitize(likeness, self.edges)
+
+
+def state_hashes(home_quantizer, target_quantizer, drop_timer=5):
+    """
+    All the states an ant can be in.
+    state = 'If the ant has food'_'time since dropping the last pheromone'_'home likeness'_'target likeness'
+    :return: list of the state hashes.
+    """
+    return [f'{_ant_food}_{_time_drop}_{_like_home}_{_like_target}'
+            for _ant_food in [True, False]
+            for _time_drop in range(drop_timer)
+            for _like_home in range(home_quantizer.buckets)
+            for _like_target in range(target_quantizer.buckets)]
+
+
+def quantization_of(home_quantizer, target_quantizer, drop_timer=5):
+    """
+    How the states were made. It is saved along with the Q-tables, as the same state hash means a different
+    likeness with other buckets or spacing.
+    :return: Dictionary describing both quantizers and the drop timer.
+    """
+    return {'home_buckets': home_quantizer.buckets, 'home_spacing': home_quantizer.spacing,
+            'home_edges': home_quantizer.edge_list,
+            'target_buckets': target_quantizer.buckets, 'target_spacing': target_quantizer.spacing,
+            'target_edges': target_quantizer.edge_list,
+            'drop_timer': drop_timer}
+
+
+def same_quantization(quantization, other):
+    # Two quantizations make the same states if they have the same drop timer and bucket edges.
+    return (quantization['drop_timer'] == other['drop_timer'] and
+            all(quantization[f'{side}_buckets'] == other[f'{side}_buckets'] and
+                np.allclose(quantization[f'{side}_edges'], other[f'{side}_edges'])
+                for side in ['home', 'target']))
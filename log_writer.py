@@ -0,0 +1,158 @@
+import threading
+import queue
+import time
+import os
+
+"""
+Background writer for the simulation logs.
+
+The simulation hands over preformatted text chunks and carries on with the next step while a separate thread does
+the actual disk writes. The queue between them is bounded, so if the disk cannot keep up the simulation waits
+(backpressure) instead of filling up the memory.
+"""
+
+
+class AsyncLogWriter:
+    def __init__(self, dir_path, max_queue=256):
+        """
+        :param dir_path: Directory in which all the log files are written.
+        :param max_queue: Maximum number of chunks waiting to be written before the simulation is made to wait.
+        """
+        self.dir_path = dir_path
+        # Check whether the specified path exists or not
+        if not os.path.exists(dir_path):
+            # Create a new directory because it does not exist
+            os.makedirs(dir_path)
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.files = {}  # Open file handles, {file_name: file}
+
+        # Statistics to see if I/O is the bottleneck.
+        self.bytes_written = 0
+        self.chunks_written = 0
+        self.write_time = 0.0  # Time the writer thread spent writing.
+        self.blocked_time = 0.0  # Time the simulation spent waiting for space in the queue.
+        self.max_queue_depth = 0
+        self.start_time = time.perf_counter()
+
+        self.error = None
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=f'AsyncLogWriter({dir_path})', daemon=True)
+        self.thread.start()
+
+    def append(self, chunks):
+        """
+        Appends text to files.
+        :param chunks: list of (file_name, text). Include extension in file name and the new lines in the text.
+        :return:
+        """
+        self._put(('a', chunks))
+
+    def overwrite(self, file_name, text):
+        """
+        Replaces the contents of a file. If several overwrites of the same file are waiting, only the last is written.
+        """
+        self._put(('w', [(file_name, text)]))
+
+    def _put(self, item):
+        if self.error is not None:
+            raise RuntimeError(f'Log writer for {self.dir_path} failed') from self.error
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize() + 1)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # Backpressure. Wait for the writer to catch up.
+            wait_start = time.perf_counter()
+            self.queue.put(item)
+            self.blocked_time += time.perf_counter() - wait_start
+
+    def _file(self, file_name, mode):
+        file = self.files.get(file_name)
+        if file is None:
+            file = open(os.path.join(self.dir_path, file_name), mode)
+            self.files[file_name] = file
+        return file
+
+    def _write(self, batch):
+        overwrites = {}
+        for kind, chunks in batch:
+            if kind == 'a':
+                for file_name, text in chunks:
+                    self._file(file_name, 'a').write(text)
+                    self.bytes_written += len(text)
+            else:
+                for file_name, text in chunks:
+                    overwrites[file_name] = text
+            self.chunks_written += 1
+        # Only the latest contents of an overwritten file matter.
+        for file_name, text in overwrites.items():
+            file = self._file(file_name, 'w')
+            file.seek(0)
+            file.truncate()
+            file.write(text)
+            self.bytes_written += len(text)
+
+    def _run(self):
+        running = True
+        while running:
+            # Take everything that is waiting so that it can be written in one go.
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = batch[:batch.index(None)]
+            if self.error is None:
+                write_start = time.perf_counter()
+                try:
+                    self._write(batch)
+                except Exception as e:
+                    # Keep draining the queue so that the simulation never deadlocks. The error is raised on the
+                    # next call from the simulation.
+                    self.error = e
+                self.write_time += time.perf_counter() - write_start
+            for _ in range(len(batch) + (0 if running else 1)):
+                self.queue.task_done()
+
+    def close(self):
+        """
+        Writes everything that is still waiting, flushes and fsyncs all the files and stops the writer thread.
+        Safe to call more than once.
+        :return:
+        """
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+        for file in self.files.values():
+            try:
+                file.flush()
+                os.fsync(file.fileno())
+            finally:
+                file.close()
+        self.files = {}
+        if self.error is not None:
+            raise RuntimeError(f'Log writer for {self.dir_path} failed') from self.error
+
+    def stats(self):
+        """
+        :return: Dictionary with the current queue depth and the write throughput.
+        """
+        return {'queue_depth': self.queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'chunks_written': self.chunks_written,
+                'mb_written': self.bytes_written / 1e6,
+                'write_mb_per_s': self.bytes_written / 1e6 / self.write_time if self.write_time else 0.0,
+                'writer_busy': self.write_time / (time.perf_counter() - self.start_time),
+                'blocked_time': self.blocked_time}
+
+    def report(self):
+        stats = self.stats()
+        return (f"Log Writer :: {stats['mb_written']:.2f} MB at {stats['write_mb_per_s']:.2f} MB/s, " +
+                f"busy {100 * stats['writer_busy']:.1f}% of the time, " +
+                f"queue depth {stats['queue_depth']} (max {stats['max_queue_depth']}), " +
+                f"simulation blocked for {stats['blocked_time']:.2f}s")
@@ -4,17 +4,26 @@ import sys
 
 
 class Perceptron:
-    def __init__(self, data, weights = None):
-        random.shuffle(data)
-        inputs = np.array([[float(x) for x in row[0:-1]] for row in data])
-        self.inputs = np.hstack((inputs, [[1]] * len(inputs))) # Append 1 to each input row, for the bias weight
-        self.outputs = np.array([float(row[-1]) for row in data])
+    def __init__(self, data, weights = None, dtype = np.float64, verbose = False):
+        # data can be a list of rows or a 2D numpy array, with the class in the last column.
+        # Use dtype = np.float32 to halve the memory for large data sets.
+        if isinstance(data, np.ndarray):
+            data = data[np.random.permutation(len(data))] # random.shuffle does not work on the rows of an array
+            inputs = data[:, 0:-1].astype(dtype)
+            self.outputs = data[:, -1].astype(dtype)
+        else:
+            random.shuffle(data)
+            inputs = np.array([[float(x) for x in row[0:-1]] for row in data], dtype=dtype)
+            self.outputs = np.array([float(row[-1]) for row in data], dtype=dtype)
+        self.dtype = dtype
+        self.inputs = np.hstack((inputs, np.ones((len(inputs), 1), dtype=dtype))) # Append 1 to each input row, for the bias weight
         self.numInputs = len(self.inputs[0])
-        if weights == None:
+        if weights is None:
             weights = np.array([random.uniform(0, 100) \
                                      for x in range(self.numInputs)])
             weights[-1] = -1 # set initial value of bias weight
-        self.weights = weights
+        self.weights = np.asarray(weights, dtype=dtype)
+        self.verbose = verbose # Print the weights every epoch
         self.error = float(sys.maxsize) # initialise error to some very high value
         self.smallestError = self.error
         self.bestWeights = self.weights
@@ -24,27 +33,52 @@ class Perceptron:
         y = np.dot(x_i, self.weights) # Activation function is the dot product of input vector and weight vector
         return 1 if y > 0 else 0
 
-    def fit(self, lr=1, numIters = 100, breakSoon=True):
+    def predictRows(self, inputs): # Same as predict for many rows that already have the bias column
+        return (inputs @ self.weights > 0).astype(self.dtype)
+
+    def predict_many(self, x, weights = None): # Batch prediction for rows without the bias column
+        weights = self.weights if weights is None else weights
+        x = np.asarray(x, dtype=self.dtype)
+        return (x @ weights[:-1] + weights[-1] > 0).astype(int)
+
+    def fit(self, lr=1, numIters = 100, breakSoon=True, batchSize = None, verbose = None):
+        # batchSize = None trains one sample at a time (the classic perceptron rule).
+        # Otherwise the weights are updated once per mini-batch of batchSize rows with matrix products,
+        # batchSize = len(data) is one update per epoch.
+        verbose = self.verbose if verbose is None else verbose
         errorList = []
         for iter in range(numIters):
-            totalError = 0.0
-            for i in range(len(self.outputs)):
-                pred = self.predict(self.inputs[i])
-                error = self.outputs[i] - pred # Error is the difference between true and predicted class
-                self.weights = self.weights + \
-                               lr * error * self.inputs[i] # multiplying with the error yields a positive or negative adjustment depending on a positive or negative prediction error
-                totalError += abs(error)
-            
+            if batchSize is None:
+                totalError = 0.0
+                for i in range(len(self.outputs)):
+                    pred = self.predict(self.inputs[i])
+                    error = self.outputs[i] - pred # Error is the difference between true and predicted class
+                    self.weights = self.weights + \
+                                   lr * error * self.inputs[i] # multiplying with the error yields a positive or negative adjustment depending on a positive or negative prediction error
+                    totalError += abs(error)
+            else:
+                totalError = self.fitBatches(lr, batchSize)
+
             self.saveBestFit(self.weights, totalError)
             if breakSoon:
                 if totalError == 0.0:
                     break
-            self.printWeights()
+            if verbose:
+                self.printWeights()
             errorList.append(totalError)
 
         self.fitHistory = errorList # Store error history for convenient plotting
         self.error = totalError
-        
+
+    def fitBatches(self, lr, batchSize): # One epoch of mini-batch updates, returns the total error of the epoch
+        totalError = 0.0
+        for start in range(0, len(self.outputs), batchSize):
+            inputs = self.inputs[start:start + batchSize]
+            errors = self.outputs[start:start + batchSize] - self.predictRows(inputs)
+            self.weights = self.weights + (lr * errors) @ inputs # Sum of the adjustments of every row in the batch
+            totalError += float(np.abs(errors).sum())
+        return totalError
+
     def saveBestFit(self, w, e): # Store the best performing weights for reuse
         if e < self.smallestError:
             self.smallestError = e
@@ -54,12 +88,9 @@ class Perceptron:
         print("\t".join(map(str, self.weights)), file=sys.stderr)
 
     def test(self): # Ideally we should split data into train/test sets to feed this method. For now, just use the data passed during initialisation.
-        e = 0.0
-        for i in range(len(self.inputs)):
-            pred = self.predict(self.inputs[i])
-            e += self.outputs[i] - pred
+        e = float((self.outputs - self.predictRows(self.inputs)).sum())
         print(e, file=sys.stdout)
-        
+
     def __str__(self):
         s = "inputs (1 sample): {}\n".format(self.inputs[0])
         s += "weights: {}\n".format(self.weights)
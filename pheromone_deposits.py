@@ -0,0 +1,66 @@
+import numpy as np
+
+"""
+All the pheromone that the ants drop goes through here.
+
+The ants only record where and how much they drop. At the end of the step all the drops of a layer are added to the
+layer in one go with np.add.at (so that several ants dropping on the same cell all count) and the touched cells are
+capped at the max value of the layer.
+Any rule that changes how much is deposited (for example deposits that decay with distance) should be given as the
+deposit_rule so that it lives in one place.
+"""
+
+
+class PheromoneDeposits:
+    def __init__(self, world, deferred=True, deposit_rule=None):
+        """
+        :param world: The world holding the pheromone layers.
+        :param deferred: If True the drops are collected and only deposited when flush() is called.
+                         If False every drop is deposited immediately (same as dropping cell by cell).
+        :param deposit_rule: Optional function(layer_name, ys, xs, amounts) -> amounts
+                             to change the amounts before they are deposited.
+        """
+        self.world = world
+        self.deferred = deferred
+        self.deposit_rule = deposit_rule
+        self.pending = {}  # {layer_name: ([ys], [xs], [amounts])}
+
+    def add(self, layer_name, x, y, amount):
+        """
+        Records one drop of pheromone at the cell (x, y).
+        """
+        if not self.deferred:
+            self.deposit(layer_name, np.array([y]), np.array([x]), np.array([amount], dtype=float))
+            return
+        if layer_name not in self.pending:
+            self.pending[layer_name] = ([], [], [])
+        ys, xs, amounts = self.pending[layer_name]
+        ys.append(y)
+        xs.append(x)
+        amounts.append(amount)
+
+    def deposit(self, layer_name, ys, xs, amounts):
+        """
+        Deposits pheromone on many cells of a layer at once and caps them at the max value of the layer.
+        :param layer_name: Name of the Float layer.
+        :param ys: Row of each deposit.
+        :param xs: Column of each deposit.
+        :param amounts: Amount of each deposit.
+        :return:
+        """
+        if self.deposit_rule is not None:
+            amounts = self.deposit_rule(layer_name, ys, xs, amounts)
+        layer = self.world.layers[layer_name]
+        np.add.at(layer, (ys, xs), amounts)
+        # capping pheromone at the cells to max value
+        layer[ys, xs] = np.minimum(layer[ys, xs], self.world.layer_data[layer_name][3])
+
+    def flush(self):
+        """
+        Deposits all the drops recorded since the last flush.
+        :return:
+        """
+        for layer_name, (ys, xs, amounts) in self.pending.items():
+            if len(amounts) != 0:
+                self.deposit(layer_name, np.array(ys), np.array(xs), np.array(amounts, dtype=float))
+        self.pending = {}
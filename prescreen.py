@@ -0,0 +1,142 @@
+from perceptron import Perceptron
+from eval_cache import parameter_names
+import pandas as pd
+import numpy as np
+import glob
+
+"""
+Pre-screening of parameter candidates before they are run.
+
+A large part of a random sweep (decay_rate near 1, drop_amount near 0, ...) collects no food at all and wastes a
+full run each. A perceptron is trained on the results of earlier sweeps (0_Parameters.csv and Bayes_Params.csv) to
+tell the points that collect food from the dead ones, and the candidates it thinks are dead are skipped or run last.
+A small random share of the rejected candidates is run anyway (the audit), which measures how many good points the
+screen throws away (the false reject rate).
+"""
+
+history_patterns = ['Analysis/*/0_Parameters.csv', 'Analysis/Bayes_Params.csv']
+
+
+def load_history(patterns=None):
+    """
+    :param patterns: Glob patterns of the parameter csv files. history_patterns if not given.
+    :return: DataFrame with the eight parameters and the total_food of every earlier run.
+    """
+    patterns = history_patterns if patterns is None else patterns
+    frames = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            df = pd.read_csv(path)
+            if all(name in df.columns for name in parameter_names + ['total_food']):
+                frames.append(df[parameter_names + ['total_food']])
+    if len(frames) == 0:
+        return pd.DataFrame(columns=parameter_names + ['total_food'])
+    return pd.concat(frames, ignore_index=True).dropna().drop_duplicates()
+
+
+class Prescreener:
+    def __init__(self, dead_food=0, reject_below=0.0, audit_rate=0.1, min_history=20, num_iters=200, seed=None):
+        """
+        :param dead_food: Runs that collect this much food or less count as dead.
+        :param reject_below: Candidates with a score below this are rejected. The score is the signed distance from
+                             the decision boundary, so a negative value only rejects points well inside the dead side.
+        :param audit_rate: Share of the rejected candidates that is run anyway to measure the false reject rate.
+        :param min_history: Below this many earlier runs (or with only one class) nothing is rejected.
+        :param num_iters: Training epochs of the perceptron.
+        :param seed: Seed of the audit sampling.
+        """
+        self.dead_food = dead_food
+        self.reject_below = reject_below
+        self.audit_rate = audit_rate
+        self.min_history = min_history
+        self.num_iters = num_iters
+        self.rng = np.random.default_rng(seed)
+        self.model = None
+        self.weights = None
+
+        self.screened = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.audited = {}  # {candidate index: total_food or None until it has run}
+
+    def fit(self, history):
+        """
+        Trains the classifier.
+        :param history: DataFrame from load_history().
+        :return: True if there was enough history to train on.
+        """
+        alive = (history['total_food'] > self.dead_food).to_numpy(dtype=float)
+        if len(history) < self.min_history or alive.min() == alive.max():
+            self.model = None
+            return False
+        data = np.hstack((history[parameter_names].to_numpy(dtype=float), alive[:, None]))
+        self.model = Perceptron(data)
+        self.model.fit(lr=0.1, numIters=self.num_iters)
+        self.weights = self.model.bestWeights
+        return True
+
+    def score(self, candidates):
+        """
+        :param candidates: (n, 8) array of parameter vectors in the order of parameter_names.
+        :return: Signed distance of every candidate from the boundary. Positive means it is expected to collect food.
+        """
+        candidates = np.asarray(candidates, dtype=float)
+        if self.model is None:
+            return np.ones(len(candidates))
+        return (candidates @ self.weights[:-1] + self.weights[-1]) / np.linalg.norm(self.weights[:-1])
+
+    def screen(self, candidates, mode='skip'):
+        """
+        Decides which candidates to run and in what order.
+        :param candidates: (n, 8) array of parameter vectors in the order of parameter_names.
+        :param mode: 'skip' drops the rejected candidates (except the audited ones).
+                     'deprioritise' keeps all of them and runs the rejected ones last, so they can be cut if time
+                     runs out.
+        :return: (indices of the candidates to run in order, scores)
+        """
+        if mode not in ['skip', 'deprioritise']:
+            raise ValueError(f"Unknown mode '{mode}'. Use 'skip' or 'deprioritise'.")
+        scores = self.score(candidates)
+        rejected = np.flatnonzero(scores < self.reject_below)
+        accepted = np.flatnonzero(scores >= self.reject_below)
+        self.screened += len(scores)
+        self.accepted += len(accepted)
+        self.rejected += len(rejected)
+
+        if mode == 'deprioritise':
+            # Every rejected candidate still runs, so all of them tell how good the screen is.
+            audit = rejected
+        else:
+            audit = rejected[self.rng.random(len(rejected)) < self.audit_rate]
+        for index in audit:
+            self.audited[int(index)] = None
+
+        # Most promising first.
+        accepted = accepted[np.argsort(-scores[accepted], kind='stable')]
+        if mode == 'skip':
+            order = np.concatenate((accepted, audit))
+        else:
+            order = np.concatenate((accepted, rejected[np.argsort(-scores[rejected], kind='stable')]))
+        return order.astype(int), scores
+
+    def record(self, index, total_food):
+        """
+        Stores the result of a candidate that was run. Only the audited ones are kept.
+        """
+        if index in self.audited:
+            self.audited[index] = total_food
+
+    def report(self):
+        """
+        :return: Dictionary with the acceptance rate, the false reject rate (share of the audited rejects that
+                 collected food) and the number of runs that were not needed.
+        """
+        audit_results = [food for food in self.audited.values() if food is not None]
+        false_rejects = sum(food > self.dead_food for food in audit_results)
+        return {'screened': self.screened,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'acceptance_rate': self.accepted / self.screened if self.screened else 1.0,
+                'audited': len(audit_results),
+                'false_reject_rate': false_rejects / len(audit_results) if len(audit_results) else float('nan'),
+                'runs_saved': self.rejected - len(self.audited)}
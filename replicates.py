@@ -0,0 +1,95 @@
+from Ants import Visualise, sim_seed, scenario_name
+from eval_cache import cached_evaluation, EvalCache
+from warm_start import warm_start_digest
+import numpy as np
+
+"""
+Replicate runs of one configuration inside one process.
+
+A single run is a noisy measure of a configuration. This runs the same configuration with several seeds one after
+the other in the same process (so the modules are only imported once) and returns the mean, the variance and the
+result of every seed.
+The seeds are the same for every configuration (common random numbers), so the difference between two
+configurations is not hidden by the difference in their luck.
+"""
+
+
+def replicate_seeds(replicates, base_seed=sim_seed):
+    """
+    :return: The seeds used for every configuration.
+    """
+    return [base_seed + index for index in range(replicates)]
+
+
+def is_plain(value):
+    if isinstance(value, (tuple, list)):
+        return all(is_plain(item) for item in value)
+    return value is None or type(value) in (bool, int, float, str)
+
+
+def scenario_of(sim_kwargs):
+    """
+    The cached scenario of runs with other settings of the simulation, as they change the result as well.
+    A warm start is described by a hash of its content. Other settings must be plain values (numbers, strings,
+    None or tuples of them), whose repr describes them in full.
+    :param sim_kwargs: Arguments for Visualise other than the eight parameters.
+    :return: Name of the scenario.
+    """
+    if len(sim_kwargs) == 0:
+        return scenario_name
+    settings = []
+    for name, value in sorted(sim_kwargs.items()):
+        if name == 'warm_start' and value is not None:
+            value = f'WarmStart({warm_start_digest(value)})'
+        elif not is_plain(value):
+            raise TypeError(f'{name} ({type(value).__name__}) can not be part of the cached scenario. '
+                            f'Use numbers, strings, None or tuples of them.')
+        settings.append((name, value))
+    return f'{scenario_name}_{settings}'
+
+
+def evaluate_replicates(params, max_steps, sim_name, seeds, write_logs=False, cache=None, telemetry_every=0,
+                        **sim_kwargs):
+    """
+    Runs one configuration once for each seed.
+    Only the imports are shared between the seeds. Every seed is a new Visualise, which allocates its own world grids
+    and colony arrays (nothing is reused from the seed before).
+    :param params: Dictionary with the eight parameters.
+    :param max_steps: Steps of each run.
+    :param sim_name: Name of the runs. Each seed is saved under <sim_name>/Seed_<seed> if more than one is run.
+    :param seeds: Seeds to run. Use replicate_seeds() so that all configurations get the same ones.
+    :param write_logs: Write the usual log files and plots for every run.
+    :param cache: EvalCache for the results of each seed. A default one is made if not given.
+    :param telemetry_every: Update the live status of each run every N steps (0 to disable).
+    :param sim_kwargs: Any other arguments for Visualise.
+    :return: {'mean': ..., 'variance': ..., 'std_error': ..., 'per_seed': {seed: total_food}}
+    """
+    if cache is None:
+        cache = EvalCache()
+    scenario = scenario_of(sim_kwargs)
+    per_seed = {}
+    for seed in seeds:
+        run_name = sim_name if len(seeds) == 1 else f'{sim_name}/Seed_{seed}'
+
+        def run_simulation():
+            para_realise = Visualise(**params,
+                                     no_show=True,
+                                     start_as='Play',
+                                     max_steps=max_steps,
+                                     sim_name=run_name,
+                                     seed=seed,
+                                     write_logs=write_logs,
+                                     telemetry_every=telemetry_every,
+                                     **sim_kwargs)
+            # If the run stopped early, the food it would have collected by max_steps keeps it comparable.
+            return {'total_food': float(para_realise.projected_food_collected)}
+
+        per_seed[seed] = cached_evaluation(params, max_steps, seed, scenario, run_simulation,
+                                           cache=cache)['total_food']
+
+    food = np.array(list(per_seed.values()))
+    variance = float(np.var(food, ddof=1)) if len(food) > 1 else 0.0
+    return {'mean': float(np.mean(food)),
+            'variance': variance,
+            'std_error': float(np.sqrt(variance / len(food))),
+            'per_seed': per_seed}
@@ -0,0 +1,252 @@
+import concurrent.futures
+from eval_cache import parameter_names
+import pandas as pd
+import numpy as np
+import argparse
+import sqlite3
+import glob
+import json
+import os
+
+"""
+Catalog of all the runs under Analysis/.
+
+Every run directory (one with a Log directory in it) is summarised into one row of an SQLite table: the parameters,
+the total food, the food curve (food per 1000 steps), the final action mix (share of each action in the last 1000
+steps), the stop reason and the runtime. Runs that write a Run_Info.json (Visualise.write_run_info) are read from it.
+Older runs are summarised from their Ant_<i>.csv files, with the parameters taken from the 0_Parameters.csv of their
+batch (runtime is not known for them).
+Updating only reads the runs that are new or changed since the last update.
+
+Build/update the catalog and show the best runs like this::
+python run_catalog.py --top=10 --where="decay_rate < 0.1"
+"""
+
+columns = ['run_path', 'batch', 'signature', *parameter_names, 'seed', 'max_steps', 'steps', 'stop_reason',
+           'total_food', 'projected_food', 'food_window', 'food_curve', 'action_mix', 'runtime']
+json_columns = ['food_curve', 'action_mix']
+# Files that change while a run is going, used to tell if a run changed since it was catalogued.
+signature_files = ['Cumulative.csv', 'Stop.csv', 'Run_Info.json']
+
+
+def find_runs(root):
+    """
+    :param root: Directory to scan (usually Analysis).
+    :return: Paths of the run directories relative to root.
+    """
+    runs = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        if 'Log' in dir_names and any(os.path.exists(os.path.join(dir_path, 'Log', file_name))
+                                      for file_name in signature_files):
+            runs.append(os.path.relpath(dir_path, root).replace(os.sep, '/'))
+        # Nothing to find inside the outputs of a run.
+        dir_names[:] = [name for name in dir_names if name not in ['Log', 'Snapshots', 'Frames', 'Eval_Cache']]
+    return sorted(runs)
+
+
+def run_signature(root, run_path):
+    log_path = os.path.join(root, run_path, 'Log')
+    return max((os.path.getmtime(os.path.join(log_path, file_name)) for file_name in signature_files
+                if os.path.exists(os.path.join(log_path, file_name))), default=0.0)
+
+
+def batch_parameters(root, run_path):
+    """
+    Parameters of an older run from the 0_Parameters.csv of the batch it belongs to.
+    :return: Dictionary of the parameters or None if they are not found.
+    """
+    parts = run_path.split('/')
+    for depth in range(len(parts) - 1, 0, -1):
+        parameter_file = os.path.join(root, *parts[:depth], '0_Parameters.csv')
+        if os.path.exists(parameter_file):
+            df = pd.read_csv(parameter_file, dtype={'sim_name': str}).set_index('sim_name')
+            if parts[depth] in df.index:
+                return {name: float(df.loc[parts[depth], name]) for name in parameter_names}
+            return None
+    return None
+
+
+def summarise_run(root, run_path, window=1000):
+    """
+    :param root: Directory the run path is relative to.
+    :param run_path: Run directory relative to root.
+    :param window: Steps per point of the food curve (for older runs).
+    :return: Dictionary with a value for each of the columns.
+    """
+    log_path = os.path.join(root, run_path, 'Log')
+    summary = {name: None for name in columns}
+    # Runs of a sweep are in the directory of their batch. Single runs are not part of any batch.
+    batch = run_path.split('/')[0] if '/' in run_path else ''
+    summary.update(run_path=run_path, batch=batch, signature=run_signature(root, run_path))
+
+    run_info_file = os.path.join(log_path, 'Run_Info.json')
+    if os.path.exists(run_info_file):
+        with open(run_info_file, 'r') as f:
+            run_info = json.load(f)
+        summary.update(run_info['parameters'])
+        for name in ['seed', 'max_steps', 'steps', 'stop_reason', 'total_food', 'projected_food', 'runtime']:
+            summary[name] = run_info[name]
+        summary['food_window'] = run_info['food_window']
+        summary['food_curve'] = run_info['food_curve']
+        summary['action_mix'] = run_info['action_mix']
+        return summary
+
+    # Older run. Everything comes from the logs.
+    summary.update(batch_parameters(root, run_path) or {})
+    stop_file = os.path.join(log_path, 'Stop.csv')
+    if os.path.exists(stop_file):
+        stop = pd.read_csv(stop_file).iloc[0]
+        summary.update(stop_reason=stop['Stop_Reason'], max_steps=int(stop['Max_Steps']),
+                       total_food=float(stop['Total_Food_Collected']),
+                       projected_food=float(stop['Projected_Food_Collected']))
+    elif os.path.exists(os.path.join(log_path, 'Cumulative.csv')):
+        summary['total_food'] = float(pd.read_csv(os.path.join(log_path, 'Cumulative.csv'))
+                                      ['Total_Food_Collected'].sum())
+
+    ant_files = glob.glob(os.path.join(log_path, 'Ant_*.csv'))
+    ant_files = [path for path in ant_files if not path.endswith('_Brain.csv')]
+    if len(ant_files) != 0:
+        ant_food = []
+        actions = []
+        for path in ant_files:
+            # Ant_<i>.csv rows are hash, action, state achieved, food collected.
+            ant_log = pd.read_csv(path, header=None, usecols=[1, 3], names=['action', 'food'])
+            ant_food.append(ant_log['food'].to_numpy())
+            actions.append(ant_log['action'].iloc[-window:])
+        # A run that was stopped in the middle of a step has one row less in the logs of some ants.
+        # Their missing rows are counted as no food.
+        food = np.zeros(max(len(values) for values in ant_food))
+        for values in ant_food:
+            food[:len(values)] += values
+        action_counts = pd.concat(actions).value_counts()
+        summary.update(steps=len(food), food_window=window,
+                       food_curve=np.add.reduceat(food, np.arange(0, len(food), window)).astype(float).tolist(),
+                       action_mix={action: count / action_counts.sum() for action, count in action_counts.items()})
+        if summary['total_food'] is None:
+            summary['total_food'] = float(food.sum())
+    return summary
+
+
+def try_summarise_run(root, run_path):
+    """
+    Same as summarise_run, but a run that can not be read does not stop the others.
+    :return: (summary or None, error message or None)
+    """
+    try:
+        return summarise_run(root, run_path), None
+    except Exception as e:
+        return None, f'{type(e).__name__}: {e}'
+
+
+class RunCatalog:
+    def __init__(self, root='Analysis', db_path=None):
+        """
+        :param root: Directory with the runs.
+        :param db_path: SQLite file of the catalog. <root>/Run_Catalog.sqlite if not given.
+        """
+        self.root = root
+        self.db_path = db_path if db_path is not None else os.path.join(root, 'Run_Catalog.sqlite')
+        self.connection = sqlite3.connect(self.db_path)
+        column_types = {name: 'REAL' for name in columns}
+        column_types.update(run_path='TEXT PRIMARY KEY', batch='TEXT', stop_reason='TEXT', food_curve='TEXT',
+                            action_mix='TEXT', seed='INTEGER', max_steps='INTEGER', steps='INTEGER',
+                            food_window='INTEGER')
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS runs "
+                                    f"({', '.join(f'{name} {column_types[name]}' for name in columns)})")
+            self.connection.execute('CREATE INDEX IF NOT EXISTS runs_total_food ON runs (total_food)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS runs_batch ON runs (batch)')
+
+    def update(self, max_workers=None):
+        """
+        Adds the new runs, refreshes the ones that changed and removes the ones that are gone.
+        :param max_workers: Number of processes reading the runs.
+        :return: Number of runs that were read. Runs that could not be read are skipped and tried again next time.
+        """
+        catalogued = dict(self.connection.execute('SELECT run_path, signature FROM runs'))
+        runs = find_runs(self.root)
+        stale = [run_path for run_path in runs
+                 if catalogued.get(run_path) != run_signature(self.root, run_path)]
+        gone = set(catalogued) - set(runs)
+
+        summaries = []
+        if len(stale) != 0:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(try_summarise_run, [self.root] * len(stale), stale)
+                for run_path, (summary, error) in zip(stale, results):
+                    if error is not None:
+                        print(f'Skipped {run_path} :: {error}')
+                    else:
+                        summaries.append(summary)
+
+        with self.connection:
+            self.connection.executemany('DELETE FROM runs WHERE run_path = ?', [(run_path,) for run_path in gone])
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO runs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [[json.dumps(summary[name]) if name in json_columns and summary[name] is not None else summary[name]
+                  for name in columns] for summary in summaries])
+        return len(summaries)
+
+    def query(self, where=None, args=(), order_by='total_food', descending=True, limit=None):
+        """
+        :param where: SQL condition on the columns, e.g. 'decay_rate < ? AND batch = ?'.
+        :param args: Values for the ? in where.
+        :param order_by: Column to sort by.
+        :param descending: Sort from the largest value.
+        :param limit: Maximum number of runs.
+        :return: DataFrame of the runs, with food_curve and action_mix decoded.
+        """
+        if order_by not in columns:
+            raise ValueError(f"Unknown column '{order_by}'.")
+        sql = 'SELECT * FROM runs'
+        if where:
+            sql += f' WHERE {where}'
+        sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        df = pd.read_sql_query(sql, self.connection, params=list(args))
+        for name in json_columns:
+            df[name] = [json.loads(value) if value is not None else None for value in df[name]]
+        return df
+
+    def top(self, k=10, by='total_food', **filters):
+        """
+        The best k runs.
+        :param by: Column to rank the runs by.
+        :param filters: column=value, or column=(low, high) for a range.
+                        e.g. top(5, batch='Batch_Trial', decay_rate=(0, 0.1))
+        :return: DataFrame of the runs.
+        """
+        conditions = []
+        args = []
+        for name, value in filters.items():
+            if name not in columns:
+                raise ValueError(f"Unknown column '{name}'.")
+            if isinstance(value, tuple):
+                conditions.append(f'{name} BETWEEN ? AND ?')
+                args += list(value)
+            else:
+                conditions.append(f'{name} = ?')
+                args.append(value)
+        return self.query(' AND '.join(conditions), args, order_by=by, limit=k)
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update the run catalog and show the best runs.')
+    parser.add_argument('--root', type=str, default='Analysis', help='Directory with the runs')
+    parser.add_argument('--db', type=str, default=None, help='SQLite file (Defaults to <root>/Run_Catalog.sqlite)')
+    parser.add_argument('--top', type=int, default=10, help='Number of runs to show')
+    parser.add_argument('--by', type=str, default='total_food', help='Column to rank the runs by')
+    parser.add_argument('--where', type=str, default=None, help="SQL condition, e.g. \"decay_rate < 0.1\"")
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes reading the runs')
+    args = parser.parse_args()
+
+    catalog = RunCatalog(args.root, args.db)
+    print(f'Updated {catalog.update(max_workers=args.workers)} runs.')
+    best = catalog.query(args.where, order_by=args.by, limit=args.top)
+    shown = list(dict.fromkeys(['run_path', args.by, *parameter_names, 'stop_reason', 'runtime']))
+    print(best[shown].to_string(index=False))
+    catalog.close()
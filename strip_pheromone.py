@@ -0,0 +1,148 @@
+from multiprocessing import shared_memory
+from scipy.signal import convolve2d
+import multiprocessing
+import numpy as np
+
+"""
+Multi-core pheromone update for large worlds (spatial domain decomposition).
+
+The pheromone grids are split into horizontal strips and each strip is owned by a worker process. The grids live in
+shared memory, so a worker reads the halo rows (the row above and below its strip) that the 3x3 dispersion stencil
+needs directly from its neighbours. There are two buffers for every layer and they take turns: the workers decay and
+disperse their strips from one buffer into the other, and after the step the world layers point at the other one.
+The world layers are views of the shared buffers (with the -inf border of the padded grids around them, see
+Visualise.pad_layers()), so the main process does not copy any grids during a step. Every step is synchronised with
+a barrier.
+
+The decay and dispersion are the same operations as Essence.decay('Percentage') and Essence.disperse(), done cell by
+cell in the same order, so the result is identical to the single process engine for the same seed.
+The ants stay in the main process. They act one after the other and share one random number stream, so splitting
+them up would change which random numbers each ant gets and the runs would no longer match.
+"""
+
+
+def decay_and_disperse(field, dispersion_matrix, decay_rate):
+    """
+    Same as Essence.decay('Percentage') followed by Essence.disperse() on a block of rows.
+    :param field: Rows to be updated with one halo row above and below (zeros if outside the world).
+    :return: The updated rows without the halo rows.
+    """
+    field = field.copy()
+    field -= field * decay_rate
+    field[field < 0] = 0
+    return convolve2d(field, dispersion_matrix, mode='same')[1:-1]
+
+
+def run_strip(buffers, row_start, row_end, dispersion_matrix, decay_rate, barrier, stop):
+    # Only the inside of the buffers is the world. The border is for the padded grids of the ants.
+    grids = buffers[:, :, 1:-1, 1:-1]
+    n_layers, r_length, c_length = grids.shape[1:]
+    source = 0  # Buffer holding the grids of the current step. Same order as StripPheromoneEngine.source.
+    # Strip with halo rows. The halo rows stay 0 at the edges of the world.
+    halo = np.zeros((row_end - row_start + 2, c_length))
+    halo_start, halo_end = max(row_start - 1, 0), min(row_end + 1, r_length)
+    offset = halo_start - (row_start - 1)
+    while True:
+        barrier.wait()  # Wait for the ants to finish the step.
+        if stop.value:
+            return
+        current, result = grids[source], grids[1 - source]
+        for layer in range(n_layers):
+            halo[offset:offset + halo_end - halo_start] = current[layer, halo_start:halo_end]
+            result[layer, row_start:row_end] = decay_and_disperse(halo, dispersion_matrix, decay_rate)
+        source = 1 - source
+        barrier.wait()  # Let the main process know the strip is done.
+
+
+def strip_worker(shm_name, shape, row_start, row_end, dispersion_matrix, decay_rate, barrier, stop):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        run_strip(np.ndarray(shape, dtype=np.float64, buffer=shm.buf), row_start, row_end, dispersion_matrix,
+                  decay_rate, barrier, stop)
+    except Exception:
+        # Do not leave the main process waiting on a strip that will never finish.
+        barrier.abort()
+        raise
+    finally:
+        shm.close()
+
+
+class StripPheromoneEngine:
+    def __init__(self, world, layer_names, dispersion_matrix, decay_rate, n_workers):
+        """
+        :param world: The world holding the pheromone layers. The layers (and their padded grids, if the world has
+                      them) are moved into shared memory.
+        :param layer_names: Float layers to be decayed and dispersed every step.
+        :param dispersion_matrix: 3x3 dispersion matrix (as given to Essence).
+        :param decay_rate: Percentage decay rate (as given to Essence).
+        :param n_workers: Number of strips/worker processes.
+        """
+        self.world = world
+        self.layer_names = list(layer_names)
+        n_workers = min(n_workers, world.r_length)
+        self.shape = (2, len(self.layer_names), world.r_length + 2, world.c_length + 2)
+        self.shm = shared_memory.SharedMemory(create=True, size=int(np.prod(self.shape)) * 8)
+        self.buffers = np.ndarray(self.shape, dtype=np.float64, buffer=self.shm.buf)
+        self.buffers[...] = -np.inf
+        for index, layer_name in enumerate(self.layer_names):
+            self.buffers[:, index, 1:-1, 1:-1] = world.layers[layer_name]
+        self.source = 0
+        self.bind_layers()
+
+        self.barrier = multiprocessing.Barrier(n_workers + 1)
+        self.stop = multiprocessing.Value('b', 0)
+        boundaries = np.linspace(0, world.r_length, n_workers + 1).astype(int)
+        self.workers = [multiprocessing.Process(target=strip_worker,
+                                                args=(self.shm.name, self.shape, boundaries[i], boundaries[i + 1],
+                                                      dispersion_matrix, decay_rate, self.barrier, self.stop),
+                                                daemon=True)
+                        for i in range(n_workers)]
+        self.closed = False
+        try:
+            for worker in self.workers:
+                worker.start()
+        except BaseException:
+            # Do not leave the shared memory or the started workers behind.
+            self.close()
+            raise
+
+    def bind_layers(self, copy=False):
+        # Points the world layers at the buffer of the current step (or at a copy of it).
+        padded_layers = getattr(self.world, 'padded_layers', {})
+        for index, layer_name in enumerate(self.layer_names):
+            padded = self.buffers[self.source, index].copy() if copy else self.buffers[self.source, index]
+            if layer_name in padded_layers:
+                padded_layers[layer_name] = padded
+            self.world.layers[layer_name] = padded[1:-1, 1:-1]
+
+    def step(self):
+        """
+        Decays and disperses all the layers once. The world layers then point at the result.
+        :return:
+        """
+        self.barrier.wait()  # Start the workers.
+        self.barrier.wait()  # Wait for all the strips.
+        self.source = 1 - self.source
+        self.bind_layers()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.stop.value = 1
+        try:
+            # Release the workers waiting for the next step so that they can see the stop flag.
+            self.barrier.wait(timeout=10)
+        except Exception:
+            self.barrier.abort()
+        for worker in self.workers:
+            if worker.pid is None:
+                continue  # Never started.
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        # The world keeps its layers after the shared memory is gone.
+        self.bind_layers(copy=True)
+        self.buffers = None
+        self.shm.close()
+        self.shm.unlink()
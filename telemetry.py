@@ -0,0 +1,211 @@
+import argparse
+import struct
+import mmap
+import glob
+import time
+import os
+try:
+    import resource
+except ImportError:
+    # Not available on Windows.
+    resource = None
+
+"""
+Live status of running simulations.
+
+Every simulation (with telemetry_every set) keeps one small fixed-size record in a memory-mapped file
+(Analysis/Telemetry/<sim_name>_<pid>.status) and rewrites it every N steps: the step, the steps per second, the food
+collected per 1000 steps, the mean exploration rate of the colony and the memory used by the process.
+The monitor reads all the records and shows one line per simulation, so stalled or very slow configurations of a
+sweep can be spotted without reading any logs.
+
+Watch all the running simulations like this::
+python telemetry.py
+"""
+
+# The record is a sequence number followed by the payload.
+SEQUENCE = struct.Struct('<Q')
+# pid, step, max_steps, steps_per_sec, food_rate, exploration_rate, rss_bytes, updated, state, sim_name
+PAYLOAD = struct.Struct('<qqqdddqdB64s')
+RECORD_SIZE = SEQUENCE.size + PAYLOAD.size
+RUNNING = 0
+FINISHED = 1
+STOPPED = 2  # Closed without reaching a stop condition (crashed or quit).
+STATES = ['Running', 'Finished', 'Stopped']
+default_dir = 'Analysis/Telemetry'
+
+
+def rss_bytes():
+    """
+    :return: Memory used by this process. The peak is used where the current value is not available.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class TelemetryPublisher:
+    def __init__(self, sim_name, max_steps, every=1000, dir_path=default_dir):
+        """
+        :param sim_name: Name of the simulation.
+        :param max_steps: Steps the simulation is meant to go for.
+        :param every: Update the record every N steps.
+        :param dir_path: Directory of the status files.
+        """
+        self.sim_name = sim_name
+        self.max_steps = max_steps
+        self.every = every
+        os.makedirs(dir_path, exist_ok=True)
+        self.path = os.path.join(dir_path, f"{sim_name.replace('/', '__')}_{os.getpid()}.status")
+        with open(self.path, 'wb') as f:
+            f.write(b'\0' * RECORD_SIZE)
+        self.file = open(self.path, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), RECORD_SIZE)
+        self.seq = 0
+        self.last_step = 0
+        self.last_time = time.perf_counter()
+        self.last_food = 0
+        self.record = (0, 0.0, 0.0, 0.0)  # step, steps_per_sec, food_rate, exploration_rate
+        self.write(RUNNING)
+
+    def publish(self, time_step, total_food, exploration_rate):
+        """
+        Updates the record. Call it every <every> steps.
+        :param time_step: The current step.
+        :param total_food: Food collected by the colony so far.
+        :param exploration_rate: Mean exploration rate of the ants.
+        :return:
+        """
+        now = time.perf_counter()
+        steps = time_step - self.last_step
+        steps_per_sec = steps / (now - self.last_time) if now > self.last_time else 0.0
+        food_rate = 1000 * (total_food - self.last_food) / steps if steps > 0 else 0.0
+        self.last_step, self.last_time, self.last_food = time_step, now, total_food
+        self.record = (time_step, steps_per_sec, food_rate, exploration_rate)
+        self.write(RUNNING)
+
+    def write(self, state):
+        # Seqlock: the sequence number is odd while the payload is being written and only made even once it is
+        # complete, so a reader that sees the same even number before and after its copy has a whole record.
+        self.seq += 1
+        SEQUENCE.pack_into(self.map, 0, self.seq)
+        PAYLOAD.pack_into(self.map, SEQUENCE.size, os.getpid(), self.record[0], self.max_steps, *self.record[1:],
+                          rss_bytes(), time.time(), state, self.sim_name.encode()[:64])
+        self.seq += 1
+        SEQUENCE.pack_into(self.map, 0, self.seq)
+
+    def close(self, state=FINISHED):
+        if self.map is None:
+            return
+        self.write(state)
+        self.map.close()
+        self.file.close()
+        self.map = None
+
+
+def read_record(path, retries=10):
+    """
+    :return: Dictionary of the record in the status file, or None if it could not be read.
+    """
+    try:
+        with open(path, 'rb') as f:
+            status_map = mmap.mmap(f.fileno(), RECORD_SIZE, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        for _ in range(retries):
+            seq_before = SEQUENCE.unpack_from(status_map, 0)[0]
+            payload = status_map[SEQUENCE.size:RECORD_SIZE]
+            seq_after = SEQUENCE.unpack_from(status_map, 0)[0]
+            if seq_before == seq_after and seq_before % 2 == 0:
+                values = PAYLOAD.unpack(payload)
+                break
+            time.sleep(0.001)
+        else:
+            return None
+    finally:
+        status_map.close()
+    (pid, step, max_steps, steps_per_sec, food_rate, exploration_rate, rss, updated, state,
+     sim_name) = values
+    return {'sim_name': sim_name.rstrip(b'\0').decode(errors='replace'), 'pid': pid, 'step': step,
+            'max_steps': max_steps, 'steps_per_sec': steps_per_sec, 'food_rate': food_rate,
+            'exploration_rate': exploration_rate, 'rss': rss, 'updated': updated, 'state': STATES[state],
+            'path': path}
+
+
+def process_alive(pid):
+    if os.name != 'posix':
+        # os.kill would end the process on Windows. Rely on the age of the record instead.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def read_all(dir_path=default_dir, stale_after=60):
+    """
+    :param stale_after: A running record that has not been updated for this many seconds is marked as stalled.
+    :return: List of the records of all the simulations, with the state updated for dead and stalled ones.
+    """
+    records = []
+    for path in sorted(glob.glob(os.path.join(dir_path, '*.status'))):
+        record = read_record(path)
+        if record is None:
+            continue
+        record['age'] = time.time() - record['updated']
+        if record['state'] == 'Running':
+            if not process_alive(record['pid']):
+                record['state'] = 'Dead'
+            elif record['age'] > stale_after:
+                record['state'] = 'Stalled'
+        records.append(record)
+    return records
+
+
+def format_records(records):
+    lines = [f"{'Simulation':<40} {'Step':>18} {'Steps/s':>9} {'Food/1k':>8} {'Explore':>8} {'RSS MB':>8} "
+             f"{'Age s':>7}  State"]
+    for record in records:
+        progress = f"{record['step']}/{record['max_steps']}"
+        lines.append(f"{record['sim_name'][-40:]:<40} {progress:>18} {record['steps_per_sec']:>9.0f} "
+                     f"{record['food_rate']:>8.1f} {record['exploration_rate']:>8.4f} "
+                     f"{record['rss'] / 1e6:>8.1f} {record['age']:>7.0f}  {record['state']}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Show the live status of all the running simulations.')
+    parser.add_argument('--dir', type=str, default=default_dir, help='Directory of the status files')
+    parser.add_argument('--interval', type=float, default=2, help='Seconds between refreshes')
+    parser.add_argument('--stale_after', type=float, default=60,
+                        help='Seconds without an update before a running simulation is marked as stalled')
+    parser.add_argument('--once', action='store_true', help='Print the status once and exit')
+    parser.add_argument('--all', action='store_true', help='Also show the finished simulations')
+    parser.add_argument('--clean', action='store_true', help='Remove the status files of finished and dead ones')
+    args = parser.parse_args()
+
+    try:
+        while True:
+            records = read_all(args.dir, args.stale_after)
+            if args.clean:
+                for record in records:
+                    if record['state'] in ['Finished', 'Stopped', 'Dead']:
+                        os.remove(record['path'])
+            if not args.all:
+                records = [record for record in records if record['state'] in ['Running', 'Stalled', 'Dead']]
+            output = format_records(records)
+            if args.once:
+                print(output)
+                break
+            print('\033[2J\033[H' + time.strftime('%H:%M:%S') + '\n' + output, flush=True)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
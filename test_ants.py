@@ -0,0 +1,79 @@
+import sys
+command_line = sys.argv
+sys.argv = command_line[:1]  # Ants.py reads the command line when imported.
+from Ants import Ant, Visualise, AHEAD, HEADINGS
+sys.argv = command_line
+from mnest.Environment import World
+from mnest.Laws import *
+from colony_state import ColonyState
+from likeness_quantizer import LikenessQuantizer
+from pheromone_deposits import PheromoneDeposits
+from types import SimpleNamespace
+import pytest
+
+"""
+Checks of the lookup tables the ants use to pick the cell ahead of them.
+
+Run like this::
+python -m pytest test_ants.py
+"""
+
+R_LENGTH = 5
+C_LENGTH = 6  # Not square, so that a mix up of x and y shows.
+
+
+def make_ant():
+    layers = {'Pheromone_Target': ['Float', (250, 10, 50), 'None', 1],
+              'Pheromone_Home': ['Float', (85, 121, 207), 'None', 1],
+              'Ants': ['Block', (255, 0, 0), 'None'],
+              'Home': ['Block', (50, 98, 209), 'None'],
+              'Target': ['Block', (204, 4, 37), 'None']}
+    world = World(layer_data=layers, r_length=R_LENGTH, c_length=C_LENGTH)
+    # No Home/Target cells, only pheromone decides.
+    world.layers['Home'] = []
+    world.layers['Target'] = []
+    Visualise.pad_layers(SimpleNamespace(world=world))
+    quantizer = LikenessQuantizer()
+    colony = ColonyState(1, quantizer, quantizer, ['move_random', 'go_home', 'go_target', 'drop_home', 'drop_target'])
+    return Ant(world=world, layer_name='Ants', position=Vector2(0, 0), deposits=PheromoneDeposits(world),
+               home_quantizer=quantizer, target_quantizer=quantizer, colony=colony, index=0)
+
+
+def in_world(x, y):
+    return 0 <= x < C_LENGTH and 0 <= y < R_LENGTH
+
+
+@pytest.mark.parametrize('direction', DIRECTIONS)
+def test_ahead_matches_laws(direction):
+    ahead = AHEAD[HEADINGS[int(direction.x), int(direction.y)]]
+    for (direction_index, dx, dy), turn in zip(ahead, (front_right, front, front_left)):
+        assert DIRECTIONS[direction_index] == turn(direction)
+        assert Vector2(dx, dy) == turn(direction)
+
+
+@pytest.mark.parametrize('direction', DIRECTIONS)
+def test_move_to_pheromone_picks_strongest_cell(direction):
+    ant = make_ant()
+    layer = ant.world.layers['Pheromone_Home']
+    # Every cell of the world, so the corners and edges are included.
+    for x in range(C_LENGTH):
+        for y in range(R_LENGTH):
+            cells = [(x + dx, y + dy) for _, dx, dy in AHEAD[HEADINGS[int(direction.x), int(direction.y)]]
+                     if in_world(x + dx, y + dy)]
+            for strongest in range(len(cells)):
+                layer[...] = 0
+                for rank, (cell_x, cell_y) in enumerate(cells):
+                    layer[cell_y, cell_x] = 0.1 * (rank + 1)
+                layer[cells[strongest][1], cells[strongest][0]] = 0.9
+                ant.position = Vector2(x, y)
+                ant.set_direction(direction)
+                ant.go_home()
+                assert (int(ant.position.x), int(ant.position.y)) == cells[strongest]
+
+            if len(cells) == 0:
+                # Facing out of a corner. The ant turns around without moving.
+                ant.position = Vector2(x, y)
+                ant.set_direction(direction)
+                ant.go_home()
+                assert ant.position == Vector2(x, y)
+                assert ant.direction == -direction
@@ -0,0 +1,192 @@
+from multiprocessing import shared_memory
+from brain_snapshot import load_snapshot, load_quantization, state_label
+from likeness_quantizer import same_quantization
+import pandas as pd
+import contextlib
+import numpy as np
+import hashlib
+import glob
+import re
+import os
+
+"""
+Starting a colony from saved Q-tables instead of all zeros.
+
+The Q-tables can come from a snapshot (.npz saved by brain_snapshot) or from the Ant_<i>_Brain.csv files of a
+prior run. Each ant starts from the table of the ant with the same index, or all of them start from the average
+table of the colony. States and actions are matched by name.
+A state hash only means the same thing with the same likeness buckets, spacing and drop timer (the quantization), so
+the tables are only loaded into a colony with the same quantization. Snapshots record it. For the Brain.csv files
+(and older snapshots) it has to be stated when loading them.
+
+A sweep driver loads the tables once and puts them in shared memory with SharedWarmStart. The workers get a small
+WarmStartHandle and copy the tables from shared memory without reading any files.
+"""
+
+
+def load_brain_csv(dir_path):
+    """
+    Loads the Ant_<i>_Brain.csv files of a run.
+    :param dir_path: Directory with the csv files (Analysis/<sim_name>/Log).
+    :return: (q_tables, states, actions) in the same form as a snapshot.
+    """
+    files = {}
+    for path in glob.glob(os.path.join(dir_path, 'Ant_*_Brain.csv')):
+        match = re.fullmatch(r'Ant_(\d+)_Brain\.csv', os.path.basename(path))
+        if match:
+            files[int(match.group(1))] = path
+    if len(files) == 0:
+        raise FileNotFoundError(f'No Ant_<i>_Brain.csv files in {dir_path}')
+    tables = [pd.read_csv(files[index], index_col=state_label, float_precision='round_trip')
+              for index in sorted(files)]
+    states = list(tables[0].index)
+    actions = list(tables[0].columns)
+    q_tables = np.stack([table.reindex(index=states, columns=actions, fill_value=0).to_numpy(dtype=float)
+                         for table in tables])
+    return q_tables, states, actions
+
+
+def load_warm_start(path, average=False, quantization=None):
+    """
+    :param path: Snapshot (.npz) or directory with the Ant_<i>_Brain.csv files.
+    :param average: Return the average table of the colony instead of one table per ant.
+    :param quantization: How the tables were made (likeness_quantizer.quantization_of()). Required for the
+                         Brain.csv files and older snapshots, which do not record it. Checked against the snapshot
+                         otherwise.
+    :return: (q_tables, states, actions, quantization)
+    """
+    if os.path.isdir(path):
+        q_tables, states, actions = load_brain_csv(path)
+        saved_quantization = None
+    else:
+        q_tables, states, actions, _ = load_snapshot(path)
+        saved_quantization = load_quantization(path)
+    if saved_quantization is None:
+        if quantization is None:
+            raise ValueError(f'{path} does not record the likeness buckets/spacing and drop timer its states were '
+                             f'made with. State them with quantization=quantization_of(...).')
+    elif quantization is not None and not same_quantization(quantization, saved_quantization):
+        raise ValueError(f'{path} was saved with {saved_quantization}, not {quantization}.')
+    else:
+        quantization = saved_quantization
+    if average:
+        q_tables = q_tables.mean(axis=0, keepdims=True)
+    return q_tables, [str(state) for state in states], [str(action) for action in actions], quantization
+
+
+def apply_warm_start(colony, q_tables, states, actions, quantization):
+    """
+    Copies the saved Q-tables into the colony. Ant i gets table i (wrapping around if there are fewer tables than
+    ants, so a single averaged table goes to every ant).
+    :param colony: ColonyState of the run.
+    :param quantization: How the tables were made. Must be the same as the colony's.
+    :return: Number of states of the colony that were filled in.
+    """
+    if not same_quantization(quantization, colony.quantization):
+        raise ValueError(f'The warm start tables were made with {quantization}, '
+                         f'but the colony uses {colony.quantization}.')
+    colony_rows = [colony.rows.get(state) for state in states]
+    colony_columns = [colony.action_list.index(action) if action in colony.action_list else None
+                      for action in actions]
+    source_rows = [row for row, colony_row in enumerate(colony_rows) if colony_row is not None]
+    source_columns = [column for column, colony_column in enumerate(colony_columns) if colony_column is not None]
+    target_rows = [colony_rows[row] for row in source_rows]
+    target_columns = [colony_columns[column] for column in source_columns]
+    selected = q_tables[:, source_rows][:, :, source_columns]
+    for index in range(colony.n_ants):
+        colony.q_tables[index][np.ix_(target_rows, target_columns)] = selected[index % len(q_tables)]
+    return len(target_rows)
+
+
+def tables_digest(q_tables, states, actions, quantization):
+    # Hash of the content of the tables, so that the same tables are the same scenario for the result cache.
+    q_tables = np.ascontiguousarray(q_tables, dtype=np.float64)
+    return hashlib.sha256(q_tables.tobytes() + repr((q_tables.shape, list(states), list(actions),
+                                                     quantization)).encode()).hexdigest()
+
+
+def warm_start_digest(warm_start):
+    """
+    :param warm_start: Anything Visualise takes as a warm start: a path for load_warm_start(), a WarmStartHandle or a
+                       (q_tables, states, actions, quantization) tuple.
+    :return: Hash of its content. A path is hashed by the content of its files, so it changes if they are rewritten.
+    """
+    if isinstance(warm_start, WarmStartHandle):
+        return warm_start.digest
+    if isinstance(warm_start, str):
+        if os.path.isdir(warm_start):
+            paths = sorted(glob.glob(os.path.join(warm_start, 'Ant_*_Brain.csv')))
+        else:
+            paths = [warm_start]
+        file_hash = hashlib.sha256()
+        for path in paths:
+            file_hash.update(os.path.basename(path).encode())
+            with open(path, 'rb') as f:
+                file_hash.update(f.read())
+        return file_hash.hexdigest()
+    return tables_digest(*warm_start)
+
+
+class WarmStartHandle:
+    # Picklable reference to a SharedWarmStart, passed to the workers.
+    def __init__(self, shm_name, shape, states, actions, quantization, digest):
+        self.shm_name = shm_name
+        self.shape = shape
+        self.states = states
+        self.actions = actions
+        self.quantization = quantization
+        self.digest = digest
+
+    def load(self):
+        """
+        :return: (q_tables, states, actions, quantization) copied out of shared memory.
+        """
+        shm = shared_memory.SharedMemory(name=self.shm_name)
+        try:
+            q_tables = np.ndarray(self.shape, dtype=np.float64, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+        return q_tables, self.states, self.actions, self.quantization
+
+    def __repr__(self):
+        # Only the content, so that the result cache sees the same warm start as the same scenario.
+        return f'WarmStart({self.digest})'
+
+
+class SharedWarmStart:
+    def __init__(self, q_tables, states, actions, quantization):
+        """
+        Puts the Q-tables in shared memory. Keep it open until all the workers have started their runs.
+        :param q_tables: (ants x states x actions) array, from load_warm_start().
+        """
+        q_tables = np.ascontiguousarray(q_tables, dtype=np.float64)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(q_tables.nbytes, 1))
+        np.ndarray(q_tables.shape, dtype=np.float64, buffer=self.shm.buf)[...] = q_tables
+        self.handle = WarmStartHandle(self.shm.name, q_tables.shape, list(states), list(actions), quantization,
+                                      tables_digest(q_tables, states, actions, quantization))
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+@contextlib.contextmanager
+def shared_warm_start(path, average=False, quantization=None):
+    """
+    Loads a warm start once and keeps it in shared memory for the workers of a sweep until the block ends.
+    :param path: Snapshot or Brain.csv directory for load_warm_start(). None to start from zeros.
+    :param average: Start all the ants from the average table of the colony.
+    :param quantization: How the tables were made, for the Brain.csv files (see load_warm_start()).
+    :return: WarmStartHandle to pass to the workers, or None if path is None.
+    """
+    if path is None:
+        yield None
+        return
+    with SharedWarmStart(*load_warm_start(path, average=average, quantization=quantization)) as shared:
+        yield shared.handle